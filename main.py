@@ -14,8 +14,15 @@ import os
 import sys
 import signal
 import time
+import functools
 import logging
 import yaml
+
+try:
+    # libyaml C parser; much faster than the pure-Python one on a Pi
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeLoader
 from enum import Enum, auto
 
 # Add project root to path
@@ -23,7 +30,9 @@ PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
 sys.path.insert(0, PROJECT_ROOT)
 
 from modules.database import Database
-from modules.face_recognition_module import FaceRecognitionModule
+from modules.face_recognition_module import (
+    FaceRecognitionModule, RecognitionWorker, MotionDetector
+)
 from modules.fingerprint_module import FingerprintModule, SimulatedFingerprintModule
 from modules.gpio_controller import GPIOController
 from modules.user_manager import UserManager
@@ -60,6 +69,9 @@ class DoorAccessSystem:
         self.state = State.IDLE
         self._running = False
         self._camera = None
+        self._camera_last_used = 0.0
+        self._recognizer = None
+        self._door_deadline = 0.0
 
         # Initialize all modules
         self._init_modules()
@@ -72,7 +84,7 @@ class DoorAccessSystem:
             sys.exit(1)
 
         with open(abs_path, "r") as f:
-            config = yaml.safe_load(f)
+            config = yaml.load(f, Loader=SafeLoader)
 
         return config
 
@@ -94,15 +106,29 @@ class DoorAccessSystem:
         # Database
         db_config = self.config.get("database", {})
         db_path = os.path.join(PROJECT_ROOT, db_config.get("path", "data/door_access.db"))
-        self.db = Database(db_path)
+        self.db = Database(
+            db_path,
+            log_batch_size=db_config.get("log_batch_size", 50),
+            log_flush_interval=db_config.get("log_flush_interval", 2.0),
+        )
         logger.info("Database initialized")
 
         # Face Recognition
         self.face = FaceRecognitionModule(self.config.get("face_recognition", {}))
+        # Start encoder workers before the recognizer threads are pinned and
+        # re-niced. The log listener and log-flush threads already run, so
+        # this fork is not single-threaded; workers only run the encoder.
+        self.face.start_encoder_pool()
+
+        # Camera motion gate, used when there is no PIR sensor
+        pir_config = self.config.get("pir", {})
+        self.motion = MotionDetector(
+            pixel_delta=pir_config.get("motion_pixel_delta", 25),
+            min_area=pir_config.get("motion_min_area", 0.02),
+        )
 
         # Load known faces from DB
-        users = self.db.get_all_users()
-        self.face.load_known_faces(users)
+        self.face.load_known_encodings(*self.db.get_all_encodings_matrix())
         if not self.face.load_encodings_cache():
             logger.info("No encodings cache found — using DB-loaded encodings")
 
@@ -138,7 +164,8 @@ class DoorAccessSystem:
     # -------------------------------------------------------------------------
 
     def _open_camera(self):
-        """Open the USB camera."""
+        """Open the USB camera, or return the handle that is already live."""
+        self._camera_last_used = time.monotonic()
         if self._camera is not None:
             return self._camera
 
@@ -151,11 +178,47 @@ class DoorAccessSystem:
         )
         return self._camera
 
+    def _start_recognizer(self, camera):
+        """Start background recognition on an open camera."""
+        if self._recognizer is None:
+            self._recognizer = RecognitionWorker(self.face, camera)
+            self._recognizer.start()
+        return self._recognizer
+
+    def _end_camera_session(self):
+        """
+        Stop background recognition but keep the camera handle open.
+
+        Reopening costs a V4L2 open plus exposure warmup, so the handle
+        stays live between visitors; _release_idle_camera frees it after
+        camera.idle_release seconds without use.
+        """
+        if self._recognizer is not None:
+            self._recognizer.stop()
+            self._recognizer = None
+        if self._camera is not None:
+            # Drop the frame buffered while nobody was reading
+            self._camera.grab()
+            self.motion.reset()
+        self._camera_last_used = time.monotonic()
+
+    def _release_idle_camera(self):
+        """Fully release the camera once it has sat unused long enough."""
+        idle_release = self.config.get("camera", {}).get("idle_release", 300)
+        if (self._camera is not None
+                and time.monotonic() - self._camera_last_used >= idle_release):
+            logger.info("Camera idle for %ds — releasing", idle_release)
+            self._close_camera()
+
     def _close_camera(self):
-        """Release the camera."""
+        """Stop background recognition and release the camera."""
+        if self._recognizer is not None:
+            self._recognizer.stop()
+            self._recognizer = None
         if self._camera is not None:
             self.face.close_camera(self._camera)
             self._camera = None
+            self.motion.reset()
 
     # -------------------------------------------------------------------------
     # Button Callbacks
@@ -177,12 +240,11 @@ class DoorAccessSystem:
         self.gpio.activate_relay()
         self.gpio.ring_buzzer("success")
         self.access_logger.log_button_event("inside", "door_opened")
-        self.state = State.DOOR_OPEN
 
-        # Reset state after relay timeout
+        # Return straight away; the main loop closes the door at the deadline
         relay_duration = self.config.get("gpio", {}).get("relay_active_duration", 5)
-        time.sleep(relay_duration)
-        self.state = State.IDLE
+        self._door_deadline = time.monotonic() + relay_duration
+        self.state = State.DOOR_OPEN
 
     # -------------------------------------------------------------------------
     # Main State Machine
@@ -204,44 +266,29 @@ class DoorAccessSystem:
             )
 
         pir_config = self.config.get("pir", {})
-        idle_timeout = pir_config.get("idle_timeout", 30)
-        cooldown = pir_config.get("cooldown", 2)
         poll_interval = pir_config.get("active_check_interval", 0.1)
 
+        # One dict lookup per tick instead of walking an elif chain
+        state_handlers = {
+            State.IDLE: functools.partial(self._handle_idle, poll_interval),
+            State.DETECTING: self._handle_detecting,
+            State.FINGERPRINT_CHECK: self._handle_fingerprint,
+            State.DOOR_OPEN: self._handle_door_open,
+            State.DENIED: self._handle_denied,
+            State.BUZZER_ALERT: self._handle_buzzer_alert,
+        }
+
         logger.info("Entering main loop — waiting for motion...")
 
         while self._running:
+            if self.state == State.SHUTTING_DOWN:
+                break
+            handler = state_handlers.get(self.state)
+            if handler is None:
+                time.sleep(0.1)
+                continue
             try:
-                if self.state == State.IDLE:
-                    self._handle_idle(poll_interval)
-
-                elif self.state == State.DETECTING:
-                    self._handle_detecting()
-
-                elif self.state == State.FINGERPRINT_CHECK:
-                    self._handle_fingerprint()
-
-                elif self.state == State.DOOR_OPEN:
-                    # Door is open — wait for relay to deactivate
-                    if self.gpio is not None:
-                        time.sleep(0.5)
-                        if not self.gpio.is_relay_active():
-                            self.state = State.IDLE
-                    else:
-                        logger.info("R&D Mode: Simulating door open delay")
-                        time.sleep(2.0)
-                        self.state = State.IDLE
-
-                elif self.state == State.DENIED:
-                    self._handle_denied()
-
-                elif self.state == State.BUZZER_ALERT:
-                    # Handled by callback, just wait
-                    time.sleep(0.1)
-
-                elif self.state == State.SHUTTING_DOWN:
-                    break
-
+                handler()
             except Exception as e:
                 logger.error("Main loop error: %s", e, exc_info=True)
                 time.sleep(1)
@@ -249,9 +296,27 @@ class DoorAccessSystem:
         self._shutdown()
 
     def _handle_idle(self, poll_interval):
-        """IDLE state — skip PIR, go directly to detecting."""
-        logger.info("R&D Mode: Bypassing motion detection")
-        self.state = State.DETECTING
+        """IDLE state — wait for motion before running face recognition."""
+        if self.gpio is not None:
+            # PIR interrupt: sleeps in the kernel until the pin rises
+            if self.gpio.wait_for_motion(timeout=1.0):
+                logger.info("Motion detected (PIR)")
+                self.state = State.DETECTING
+            else:
+                self._release_idle_camera()
+            return
+
+        # No PIR — difference small grayscale frames instead
+        camera = self._open_camera()
+        if camera is None:
+            time.sleep(1.0)
+            return
+
+        if self.motion.update(self.face.capture_frame(camera)):
+            logger.info("Motion detected (camera)")
+            self.state = State.DETECTING
+        else:
+            time.sleep(poll_interval)
 
     def _handle_detecting(self):
         """DETECTING state — capture face and attempt recognition."""
@@ -261,9 +326,10 @@ class DoorAccessSystem:
             self.state = State.FINGERPRINT_CHECK
             return
 
-        # Try face recognition
-        result = self.user_manager.identify_by_face(camera)
-        user, frame, confidence = result
+        # Results come from the background recognizer; this only waits
+        user, frame, confidence = self.user_manager.identify_by_face_worker(
+            self._start_recognizer(camera)
+        )
 
         if user:
             # Face recognized — grant access
@@ -282,6 +348,22 @@ class DoorAccessSystem:
             print("\n*** Access Denied: Face not recognized ***\n")
             self.state = State.DENIED
 
+    def _handle_door_open(self):
+        """DOOR_OPEN state — lock up again once the deadline passes."""
+        remaining = self._door_deadline - time.monotonic()
+        relay_on = self.gpio is None or self.gpio.is_relay_active()
+        if remaining > 0 and relay_on:
+            time.sleep(min(0.05, remaining))
+            return
+
+        if self.gpio is not None and self.gpio.is_relay_active():
+            self.gpio.deactivate_relay()
+        self.state = State.IDLE
+
+    def _handle_buzzer_alert(self):
+        """BUZZER_ALERT state — handled by the button callback, just wait."""
+        time.sleep(0.1)
+
     def _handle_fingerprint(self):
         """FINGERPRINT_CHECK state — scan fingerprint."""
         if not self.fingerprint.is_connected():
@@ -304,8 +386,8 @@ class DoorAccessSystem:
             self.gpio.flash_off()
         self.access_logger.log_access_denied("biometric")
 
-        # Turn off flash and camera
-        self._close_camera()
+        # Stop recognition; the camera handle stays open for the next visitor
+        self._end_camera_session()
 
         # Wait before returning to idle
         time.sleep(3)
@@ -334,7 +416,13 @@ class DoorAccessSystem:
             image_path=image_path
         )
 
-        self._close_camera()
+        self._end_camera_session()
+        if self.gpio is not None:
+            relay_duration = self.config.get("gpio", {}).get("relay_active_duration", 5)
+        else:
+            logger.info("R&D Mode: Simulating door open delay")
+            relay_duration = 2.0
+        self._door_deadline = time.monotonic() + relay_duration
         self.state = State.DOOR_OPEN
 
     # -------------------------------------------------------------------------
@@ -365,6 +453,13 @@ class DoorAccessSystem:
         if self.gpio:
             self.gpio.cleanup()
 
+        # Write out any buffered access logs before the final sync
+        self.access_logger.close()
+        try:
+            self.db.flush()
+        except Exception as e:
+            logger.error("Failed to flush access logs: %s", e)
+
         # Final sync attempt
         try:
             self.firebase.sync_now()
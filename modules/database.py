@@ -9,22 +9,235 @@ Tables:
 
 import sqlite3
 import os
+import queue
+import zlib
+import base64
 import pickle
+import atexit
+import collections
 import threading
 import logging
-from datetime import datetime
+import numpy as np
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+# urllib.request.pathname2url is quote() on POSIX; importing urllib.request
+# itself would also load http.client, email and ssl at startup
+from urllib.parse import quote as pathname2url
 
 logger = logging.getLogger(__name__)
 
+# Per-connection tuning for an SD-card backed Pi. synchronous=NORMAL under WAL
+# only fsyncs at checkpoints rather than on every commit.
+CONNECTION_PRAGMAS = (
+    "PRAGMA foreign_keys=ON",
+    "PRAGMA busy_timeout=30000",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-20000",
+    "PRAGMA mmap_size=134217728",
+)
+WRITER_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA wal_autocheckpoint=1000",
+)
+
+# Writer statements, kept as fixed literals so the per-connection statement
+# cache hits on every call.
+SQL_INSERT_USER = """INSERT INTO users
+                     (name, face_encoding, face_encoding_b64, fingerprint_id, registered_at)
+                     VALUES (?, ?, ?, ?, ?)"""
+SQL_UPDATE_USER_FACE = """UPDATE users SET face_encoding=?, face_encoding_b64=?,
+                          updated_at=?, synced=0 WHERE id=?"""
+SQL_UPDATE_USER_FINGERPRINT = "UPDATE users SET fingerprint_id=?, updated_at=?, synced=0 WHERE id=?"
+SQL_DEACTIVATE_USER = "UPDATE users SET active=0, updated_at=?, synced=0 WHERE id=?"
+SQL_INSERT_ACCESS_LOG = """INSERT INTO access_logs
+                           (user_id, user_name, method, direction, status,
+                            timestamp, image_path, confidence)
+                           VALUES (?, ?, ?, ?, ?, ?, ?, ?)"""
+SQL_INSERT_FINGERPRINT_BACKUP = """INSERT INTO fingerprint_backup
+                                   (user_id, fingerprint_id, template_data, created_at)
+                                   VALUES (?, ?, ?, ?)"""
+SQL_UPDATE_SYNC_ATTEMPT = "UPDATE sync_queue SET attempts=attempts+1, last_attempt=? WHERE id=?"
+SQL_DELETE_SYNC = "DELETE FROM sync_queue WHERE table_name=? AND record_id=?"
+SQL_MARK_SYNCED = {
+    "users": "UPDATE users SET synced=1 WHERE id=?",
+    "access_logs": "UPDATE access_logs SET synced=1 WHERE id=?",
+    "fingerprint_backup": "UPDATE fingerprint_backup SET synced=1 WHERE id=?",
+}
+
+# Reader statements
+SQL_GET_USER = "SELECT * FROM users WHERE id=? AND active=1"
+SQL_GET_USER_BY_FINGERPRINT = "SELECT * FROM users WHERE fingerprint_id=? AND active=1"
+SQL_GET_USER_BY_FINGERPRINT_LIGHT = """SELECT id, name, fingerprint_id FROM users
+                                       WHERE fingerprint_id=? AND active=1"""
+USER_COLUMNS = ("id", "name", "face_encoding", "fingerprint_id",
+                "registered_at", "updated_at", "synced", "active")
+_USER_SELECT = f"SELECT {', '.join(USER_COLUMNS)} FROM users"
+SQL_GET_ACTIVE_USERS = _USER_SELECT + " WHERE active=1"
+SQL_GET_ACTIVE_ENCODINGS = """SELECT id, name, face_encoding FROM users
+                              WHERE active=1 AND face_encoding IS NOT NULL"""
+SQL_GET_FINGERPRINT_BACKUPS = "SELECT * FROM fingerprint_backup"
+SQL_GET_RECENT_LOGS = "SELECT * FROM access_logs ORDER BY timestamp DESC LIMIT ?"
+# Listing columns, all held in idx_access_logs_ts_cov (no table lookups).
+# Defaults and column-width truncation happen in SQLite, so each row comes
+# back ready to format.
+RECENT_LOG_LINE_COLUMNS = ("timestamp", "user_name", "method", "direction", "status")
+SQL_GET_RECENT_LOG_LINES = """SELECT substr(timestamp, 1, 19),
+                                     substr(COALESCE(user_name, 'Unknown'), 1, 14),
+                                     substr(method, 1, 11),
+                                     COALESCE(direction, '?'),
+                                     status
+                              FROM access_logs ORDER BY timestamp DESC LIMIT ?"""
+SQL_GET_LOGS_BY_DATE = """SELECT * FROM access_logs
+                          WHERE timestamp >= ? AND timestamp < ?
+                          ORDER BY timestamp DESC"""
+# Column order of CSV exports; iter_log_rows yields plain tuples in this order
+LOG_EXPORT_COLUMNS = ("id", "user_id", "user_name", "method", "direction",
+                      "status", "timestamp", "confidence", "image_path")
+_LOG_EXPORT_SELECT = f"SELECT {', '.join(LOG_EXPORT_COLUMNS)} FROM access_logs"
+SQL_EXPORT_LOGS_BY_DATE = _LOG_EXPORT_SELECT + """
+                          WHERE timestamp >= ? AND timestamp < ?
+                          ORDER BY timestamp DESC"""
+SQL_EXPORT_RECENT_LOGS = _LOG_EXPORT_SELECT + " ORDER BY timestamp DESC LIMIT ?"
+# Stand-ins for a missing end of a one-sided date range, so the query
+# keeps the plain `timestamp >= ? AND timestamp < ?` index range
+LOG_TIMESTAMP_MIN = "0000-01-01T00:00:00"
+LOG_TIMESTAMP_MAX = "9999-12-31T23:59:59"
+SQL_GET_PENDING_SYNC = "SELECT * FROM sync_queue ORDER BY created_at ASC LIMIT ?"
+SQL_GET_PENDING_SYNC_FOR_TABLE = """SELECT * FROM sync_queue
+                                    WHERE table_name=? ORDER BY created_at ASC LIMIT ?"""
+SQL_GET_UNSYNCED_LOGS = "SELECT * FROM access_logs WHERE synced=0 ORDER BY timestamp ASC"
+# Sync also needs the precomputed upload form of the encoding
+SQL_GET_UNSYNCED_USERS = f"""SELECT {', '.join(USER_COLUMNS)}, face_encoding_b64
+                              FROM users WHERE synced=0"""
+SQL_COUNT_ACTIVE_USERS = "SELECT COUNT(*) FROM users WHERE active=1"
+SQL_COUNT_LOGS = "SELECT COUNT(*) FROM access_logs"
+SQL_COUNT_PENDING_SYNC = "SELECT COUNT(*) FROM sync_queue"
+SQL_COUNT_LOGS_IN_RANGE = "SELECT COUNT(*) FROM access_logs WHERE timestamp >= ? AND timestamp < ?"
+# One pass over a day's rows; SUM() over an empty range is NULL, hence COALESCE
+SQL_GET_DAILY_COUNTS = """SELECT COUNT(*),
+                                 COALESCE(SUM(status = 'granted'), 0),
+                                 COALESCE(SUM(status = 'denied'), 0),
+                                 COALESCE(SUM(method = 'face'), 0),
+                                 COALESCE(SUM(method = 'fingerprint'), 0),
+                                 COALESCE(SUM(instr(method, 'button') > 0), 0)
+                          FROM access_logs
+                          WHERE timestamp >= ? AND timestamp < ?"""
+SQL_GET_STATS = f"""SELECT ({SQL_COUNT_ACTIVE_USERS}),
+                          ({SQL_COUNT_LOGS}),
+                          ({SQL_COUNT_PENDING_SYNC}),
+                          ({SQL_COUNT_LOGS_IN_RANGE})"""
+
+# Statements per connection kept compiled by the sqlite3 module (default 128)
+STATEMENT_CACHE_SIZE = 256
+
+# Face encodings are stored as raw little-endian float32 (128 × 4 bytes).
+# Schema version 1 introduced this format; older rows hold pickled arrays.
+ENCODING_DIM = 128
+ENCODING_DTYPE = np.dtype("<f4")
+ENCODING_BYTES = ENCODING_DIM * ENCODING_DTYPE.itemsize
+
+# Fingerprint templates (R503 characteristics, a list of byte values) are
+# stored as a one-byte format tag followed by the zlib-compressed bytes.
+# Schema version 2 introduced this; older rows hold pickled lists, which
+# always start with the pickle PROTO opcode 0x80 and so never collide.
+TEMPLATE_FORMAT_ZLIB = 0x01
+TEMPLATE_ZLIB_LEVEL = 6
+
+SCHEMA_VERSION = 3
+
+
+def _now_iso():
+    """Current local time as an ISO-8601 string, millisecond precision."""
+    return datetime.now().isoformat(timespec="milliseconds")
+
+
+def encode_face_encoding(encoding):
+    """Serialize a face encoding to a raw float32 BLOB."""
+    return np.ascontiguousarray(encoding, dtype=ENCODING_DTYPE).tobytes()
+
+
+def decode_face_encoding(blob):
+    """Deserialize a raw float32 BLOB back into a writable numpy array."""
+    return np.frombuffer(blob, dtype=ENCODING_DTYPE).astype(np.float32)
+
+
+def face_encoding_b64(blob):
+    """Base64 text of a float32 encoding BLOB, as uploaded to Firebase."""
+    return base64.b64encode(blob).decode("ascii") if blob else None
+
+
+def encode_fingerprint_template(template_data):
+    """Serialize sensor characteristics to a tagged, compressed BLOB."""
+    if not template_data:
+        return None
+    return bytes((TEMPLATE_FORMAT_ZLIB,)) + zlib.compress(
+        bytes(template_data), TEMPLATE_ZLIB_LEVEL
+    )
+
+
+def decode_fingerprint_template(blob):
+    """Deserialize a template BLOB (compressed or legacy pickle) to a list."""
+    if not blob:
+        return None
+    if blob[0] == TEMPLATE_FORMAT_ZLIB:
+        return list(zlib.decompress(blob[1:]))
+    return pickle.loads(blob)
 
-class Database:
-    """Thread-safe SQLite database for the door access system."""
 
-    def __init__(self, db_path="data/door_access.db"):
+class Database:
+    """
+    Thread-safe SQLite database for the door access system.
+
+    Only writes take `_lock`: they share one connection and one transaction
+    at a time. Reads never touch the lock; each borrows its own read-only
+    connection from the pool and runs concurrently with the writer under WAL.
+    Access logs sit in a memory buffer for up to log_flush_interval, so
+    plain reads may not see the newest few; only export and sync flush first.
+    """
+
+    def __init__(self, db_path="data/door_access.db", read_pool_size=4,
+                 log_batch_size=50, log_flush_interval=2.0, read_only=False):
+        """
+        Args:
+            db_path: Path to the SQLite database file.
+            read_pool_size: Number of read-only connections kept open for SELECTs.
+            log_batch_size: Buffered access logs that trigger an early flush.
+            log_flush_interval: Max seconds an access log waits in the buffer.
+            read_only: Open only read-only connections to an existing file
+                (query tools): no writer, schema setup or flush thread.
+        """
         self.db_path = db_path
+        self.read_only = read_only
         self._lock = threading.Lock()
-        self._ensure_directory()
-        self._init_db()
+        self._log_batch_size = max(1, log_batch_size)
+        self._log_flush_interval = log_flush_interval
+        self._log_buf = collections.deque()
+        self._log_cond = threading.Condition()
+        self._log_closed = False
+
+        # Single writer serialized by the lock; readers share a pool so
+        # SELECTs run concurrently under WAL without taking the lock.
+        self._write_conn = None
+        if not read_only:
+            self._ensure_directory()
+            self._write_conn = self._connect()
+            self._init_db()
+            self._migrate()
+        self._read_pool = queue.Queue()
+        for _ in range(max(1, read_pool_size)):
+            self._read_pool.put(self._connect(read_only=True))
+
+        # Access logs are appended to an in-memory buffer and written in one
+        # transaction per batch, so the door path doesn't pay an fsync each.
+        self._log_flush_thread = None
+        if not read_only:
+            self._log_flush_thread = threading.Thread(
+                target=self._log_flush_loop, name="access-log-flush", daemon=True
+            )
+            self._log_flush_thread.start()
+
+        atexit.register(self.close)
 
     def _ensure_directory(self):
         """Create database directory if it doesn't exist."""
@@ -32,78 +245,246 @@ class Database:
         if db_dir and not os.path.exists(db_dir):
             os.makedirs(db_dir, exist_ok=True)
 
-    def _get_connection(self):
-        """Get a new connection (one per call for thread safety)."""
-        conn = sqlite3.connect(self.db_path)
+    def _connect(self, read_only=False):
+        """Open a new connection (read-write, or read-only via URI)."""
+        if read_only:
+            uri = f"file:{pathname2url(os.path.abspath(self.db_path))}?mode=ro"
+            conn = sqlite3.connect(
+                uri, uri=True, check_same_thread=False,
+                cached_statements=STATEMENT_CACHE_SIZE
+            )
+            conn.execute("PRAGMA query_only=ON")
+        else:
+            # Autocommit mode: _writer() issues BEGIN/COMMIT itself instead of
+            # letting the sqlite3 module open implicit DEFERRED transactions.
+            conn = sqlite3.connect(
+                self.db_path, check_same_thread=False, isolation_level=None,
+                cached_statements=STATEMENT_CACHE_SIZE
+            )
+            for pragma in WRITER_PRAGMAS:
+                conn.execute(pragma)
         conn.row_factory = sqlite3.Row
-        conn.execute("PRAGMA journal_mode=WAL")
-        conn.execute("PRAGMA foreign_keys=ON")
+        for pragma in CONNECTION_PRAGMAS:
+            conn.execute(pragma)
         return conn
 
-    def _init_db(self):
-        """Initialize database tables."""
+    @contextmanager
+    def _writer(self):
+        """Hold the write lock and run the block in one writer transaction."""
+        if self._write_conn is None:
+            raise sqlite3.OperationalError("database was opened read-only")
         with self._lock:
-            conn = self._get_connection()
+            conn = self._write_conn
+            # Take the RESERVED lock up front instead of upgrading a
+            # deferred transaction mid-way, which can hit SQLITE_BUSY.
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+                conn.execute("COMMIT")
+            except BaseException:
+                # SQLite may already have rolled back on some errors
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+                raise
+
+    @contextmanager
+    def _reader(self):
+        """Borrow a read-only connection from the pool."""
+        conn = self._read_pool.get()
+        try:
+            yield conn
+        finally:
+            self._read_pool.put(conn)
+
+    def close(self):
+        """Flush buffered logs, then close the pooled readers and the writer."""
+        with self._log_cond:
+            if self._log_closed:
+                return
+            self._log_closed = True
+            self._log_cond.notify()
+        if self._log_flush_thread is not None:
+            self._log_flush_thread.join(timeout=5)
+        self.flush()
+
+        # Readers first: the last connection to close checkpoints and removes
+        # the -wal/-shm files, and a mode=ro reader can't do that
+        while True:
+            try:
+                conn = self._read_pool.get_nowait()
+            except queue.Empty:
+                break
             try:
-                conn.executescript("""
-                    CREATE TABLE IF NOT EXISTS users (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        name TEXT NOT NULL,
-                        face_encoding BLOB,
-                        fingerprint_id INTEGER DEFAULT -1,
-                        registered_at TEXT NOT NULL,
-                        updated_at TEXT,
-                        synced INTEGER DEFAULT 0,
-                        active INTEGER DEFAULT 1
-                    );
-
-                    CREATE TABLE IF NOT EXISTS access_logs (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        user_id INTEGER,
-                        user_name TEXT DEFAULT 'Unknown',
-                        method TEXT NOT NULL,
-                        direction TEXT DEFAULT 'in',
-                        status TEXT NOT NULL,
-                        timestamp TEXT NOT NULL,
-                        image_path TEXT,
-                        confidence REAL DEFAULT 0.0,
-                        synced INTEGER DEFAULT 0,
-                        FOREIGN KEY (user_id) REFERENCES users(id)
-                    );
-
-                    CREATE TABLE IF NOT EXISTS sync_queue (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        table_name TEXT NOT NULL,
-                        record_id INTEGER NOT NULL,
-                        action TEXT NOT NULL,
-                        created_at TEXT NOT NULL,
-                        attempts INTEGER DEFAULT 0,
-                        last_attempt TEXT
-                    );
-
-                    CREATE TABLE IF NOT EXISTS fingerprint_backup (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        user_id INTEGER NOT NULL,
-                        fingerprint_id INTEGER NOT NULL,
-                        template_data BLOB,
-                        created_at TEXT NOT NULL,
-                        synced INTEGER DEFAULT 0,
-                        FOREIGN KEY (user_id) REFERENCES users(id)
-                    );
-
-                    CREATE INDEX IF NOT EXISTS idx_access_logs_timestamp
-                        ON access_logs(timestamp);
-                    CREATE INDEX IF NOT EXISTS idx_access_logs_synced
-                        ON access_logs(synced);
-                    CREATE INDEX IF NOT EXISTS idx_users_fingerprint
-                        ON users(fingerprint_id);
-                    CREATE INDEX IF NOT EXISTS idx_sync_queue_table
-                        ON sync_queue(table_name);
-                """)
-                conn.commit()
-                logger.info("Database initialized at %s", self.db_path)
-            finally:
                 conn.close()
+            except sqlite3.Error:
+                pass
+        with self._lock:
+            try:
+                if self._write_conn is not None:
+                    self._write_conn.close()
+            except sqlite3.Error:
+                pass
+
+    def _init_db(self):
+        """Initialize database tables."""
+        # executescript() runs its own statements, so the transaction is
+        # part of the script rather than coming from _writer().
+        with self._lock:
+            self._write_conn.executescript("""
+                BEGIN IMMEDIATE;
+
+                CREATE TABLE IF NOT EXISTS users (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    name TEXT NOT NULL,
+                    face_encoding BLOB,
+                    face_encoding_b64 TEXT,
+                    fingerprint_id INTEGER DEFAULT -1,
+                    registered_at TEXT NOT NULL,
+                    updated_at TEXT,
+                    synced INTEGER DEFAULT 0,
+                    active INTEGER DEFAULT 1
+                );
+
+                CREATE TABLE IF NOT EXISTS access_logs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    user_id INTEGER,
+                    user_name TEXT DEFAULT 'Unknown',
+                    method TEXT NOT NULL,
+                    direction TEXT DEFAULT 'in',
+                    status TEXT NOT NULL,
+                    timestamp TEXT NOT NULL,
+                    image_path TEXT,
+                    confidence REAL DEFAULT 0.0,
+                    synced INTEGER DEFAULT 0,
+                    FOREIGN KEY (user_id) REFERENCES users(id)
+                );
+
+                CREATE TABLE IF NOT EXISTS sync_queue (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    table_name TEXT NOT NULL,
+                    record_id INTEGER NOT NULL,
+                    action TEXT NOT NULL,
+                    created_at TEXT NOT NULL,
+                    attempts INTEGER DEFAULT 0,
+                    last_attempt TEXT
+                );
+
+                CREATE TABLE IF NOT EXISTS fingerprint_backup (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    user_id INTEGER NOT NULL,
+                    fingerprint_id INTEGER NOT NULL,
+                    template_data BLOB,
+                    created_at TEXT NOT NULL,
+                    synced INTEGER DEFAULT 0,
+                    FOREIGN KEY (user_id) REFERENCES users(id)
+                );
+
+                -- Timestamp ranges plus the columns the daily summary and
+                -- the recent-log listing read, so both stay in the index.
+                DROP INDEX IF EXISTS idx_access_logs_timestamp;
+                CREATE INDEX IF NOT EXISTS idx_access_logs_ts_cov
+                    ON access_logs(timestamp, status, method, direction, user_name);
+                DROP INDEX IF EXISTS idx_access_logs_synced;
+                CREATE INDEX IF NOT EXISTS idx_access_logs_unsynced_ts
+                    ON access_logs(synced, timestamp) WHERE synced=0;
+                CREATE INDEX IF NOT EXISTS idx_users_unsynced
+                    ON users(synced) WHERE synced=0;
+                -- Covering index for the fingerprint door path; id is the
+                -- rowid, which every index entry already carries.
+                DROP INDEX IF EXISTS idx_users_fingerprint;
+                CREATE INDEX IF NOT EXISTS idx_users_fp_cov
+                    ON users(fingerprint_id, active, name);
+                CREATE INDEX IF NOT EXISTS idx_sync_queue_table
+                    ON sync_queue(table_name);
+
+                -- Queue every user/log change for Firebase inside the engine,
+                -- in the same statement as the write that caused it.
+                CREATE TRIGGER IF NOT EXISTS trg_users_sync_create
+                    AFTER INSERT ON users
+                BEGIN
+                    INSERT INTO sync_queue (table_name, record_id, action, created_at)
+                    VALUES ('users', NEW.id, 'create', NEW.registered_at);
+                END;
+
+                CREATE TRIGGER IF NOT EXISTS trg_users_sync_update
+                    AFTER UPDATE OF updated_at ON users
+                BEGIN
+                    INSERT INTO sync_queue (table_name, record_id, action, created_at)
+                    VALUES ('users', NEW.id,
+                            CASE WHEN NEW.active=0 THEN 'delete' ELSE 'update' END,
+                            NEW.updated_at);
+                END;
+
+                CREATE TRIGGER IF NOT EXISTS trg_access_logs_sync_create
+                    AFTER INSERT ON access_logs
+                BEGIN
+                    INSERT INTO sync_queue (table_name, record_id, action, created_at)
+                    VALUES ('access_logs', NEW.id, 'create', NEW.timestamp);
+                END;
+
+                COMMIT;
+            """)
+            logger.info("Database initialized at %s", self.db_path)
+
+    def _migrate(self):
+        """Bring an older database file up to SCHEMA_VERSION."""
+        version = self._write_conn.execute("PRAGMA user_version").fetchone()[0]
+        if version >= SCHEMA_VERSION:
+            return
+
+        with self._writer() as conn:
+            if version < 1:
+                # Pickled face encodings -> raw float32 BLOBs
+                rows = conn.execute(
+                    "SELECT id, face_encoding FROM users WHERE face_encoding IS NOT NULL"
+                ).fetchall()
+                migrated = 0
+                for row in rows:
+                    blob = row["face_encoding"]
+                    if len(blob) == ENCODING_BYTES:
+                        continue
+                    conn.execute(
+                        "UPDATE users SET face_encoding=? WHERE id=?",
+                        (encode_face_encoding(pickle.loads(blob)), row["id"])
+                    )
+                    migrated += 1
+                if migrated:
+                    logger.info("Migrated %d face encodings to float32 storage", migrated)
+
+            if version < 2:
+                # Pickled fingerprint templates -> tagged zlib BLOBs
+                rows = conn.execute(
+                    "SELECT id, template_data FROM fingerprint_backup "
+                    "WHERE template_data IS NOT NULL"
+                ).fetchall()
+                migrated = 0
+                for row in rows:
+                    blob = row["template_data"]
+                    if blob[0] == TEMPLATE_FORMAT_ZLIB:
+                        continue
+                    conn.execute(
+                        "UPDATE fingerprint_backup SET template_data=? WHERE id=?",
+                        (encode_fingerprint_template(pickle.loads(blob)), row["id"])
+                    )
+                    migrated += 1
+                if migrated:
+                    logger.info("Compressed %d fingerprint template backups", migrated)
+
+            if version < 3:
+                # Precomputed base64 of the encoding for Firebase uploads
+                columns = [row["name"] for row in conn.execute("PRAGMA table_info(users)")]
+                if "face_encoding_b64" not in columns:
+                    conn.execute("ALTER TABLE users ADD COLUMN face_encoding_b64 TEXT")
+                rows = conn.execute(
+                    "SELECT id, face_encoding FROM users "
+                    "WHERE face_encoding IS NOT NULL AND face_encoding_b64 IS NULL"
+                ).fetchall()
+                conn.executemany(
+                    "UPDATE users SET face_encoding_b64=? WHERE id=?",
+                    [(face_encoding_b64(row["face_encoding"]), row["id"]) for row in rows]
+                )
+
+            conn.execute(f"PRAGMA user_version={SCHEMA_VERSION}")
 
     # -------------------------------------------------------------------------
     # User Operations
@@ -115,141 +496,154 @@ class Database:
 
         Args:
             name: User's display name.
-            face_encoding: 128-d numpy array (will be pickled), or None.
+            face_encoding: 128-d numpy array (stored as float32), or None.
             fingerprint_id: ID from the R503 sensor, or -1 if not enrolled.
 
         Returns:
             int: The new user's ID.
         """
-        encoding_blob = pickle.dumps(face_encoding) if face_encoding is not None else None
-        now = datetime.now().isoformat()
-
-        with self._lock:
-            conn = self._get_connection()
-            try:
-                cursor = conn.execute(
-                    """INSERT INTO users (name, face_encoding, fingerprint_id, registered_at)
-                       VALUES (?, ?, ?, ?)""",
-                    (name, encoding_blob, fingerprint_id, now)
-                )
-                user_id = cursor.lastrowid
-                # Add to sync queue
-                conn.execute(
-                    """INSERT INTO sync_queue (table_name, record_id, action, created_at)
-                       VALUES ('users', ?, 'create', ?)""",
-                    (user_id, now)
-                )
-                conn.commit()
-                logger.info("User '%s' registered with ID %d", name, user_id)
-                return user_id
-            finally:
-                conn.close()
+        encoding_blob = (
+            encode_face_encoding(face_encoding) if face_encoding is not None else None
+        )
+        now = _now_iso()
+
+        with self._writer() as conn:
+            cursor = conn.execute(
+                SQL_INSERT_USER,
+                (name, encoding_blob, face_encoding_b64(encoding_blob),
+                 fingerprint_id, now)
+            )
+            user_id = cursor.lastrowid
+            logger.info("User '%s' registered with ID %d", name, user_id)
+            return user_id
 
     def update_user_face(self, user_id, face_encoding):
         """Update a user's face encoding."""
-        encoding_blob = pickle.dumps(face_encoding)
-        now = datetime.now().isoformat()
+        encoding_blob = encode_face_encoding(face_encoding)
+        now = _now_iso()
 
-        with self._lock:
-            conn = self._get_connection()
-            try:
-                conn.execute(
-                    "UPDATE users SET face_encoding=?, updated_at=?, synced=0 WHERE id=?",
-                    (encoding_blob, now, user_id)
-                )
-                conn.execute(
-                    """INSERT INTO sync_queue (table_name, record_id, action, created_at)
-                       VALUES ('users', ?, 'update', ?)""",
-                    (user_id, now)
-                )
-                conn.commit()
-                logger.info("Updated face encoding for user %d", user_id)
-            finally:
-                conn.close()
+        with self._writer() as conn:
+            conn.execute(
+                SQL_UPDATE_USER_FACE,
+                (encoding_blob, face_encoding_b64(encoding_blob), now, user_id)
+            )
+            logger.info("Updated face encoding for user %d", user_id)
 
     def update_user_fingerprint(self, user_id, fingerprint_id):
         """Update a user's fingerprint ID."""
-        now = datetime.now().isoformat()
+        now = _now_iso()
 
-        with self._lock:
-            conn = self._get_connection()
-            try:
-                conn.execute(
-                    "UPDATE users SET fingerprint_id=?, updated_at=?, synced=0 WHERE id=?",
-                    (fingerprint_id, now, user_id)
-                )
-                conn.execute(
-                    """INSERT INTO sync_queue (table_name, record_id, action, created_at)
-                       VALUES ('users', ?, 'update', ?)""",
-                    (user_id, now)
-                )
-                conn.commit()
-                logger.info("Updated fingerprint for user %d → sensor ID %d", user_id, fingerprint_id)
-            finally:
-                conn.close()
+        with self._writer() as conn:
+            conn.execute(SQL_UPDATE_USER_FINGERPRINT, (fingerprint_id, now, user_id))
+            logger.info("Updated fingerprint for user %d → sensor ID %d", user_id, fingerprint_id)
 
     def get_user(self, user_id):
         """Get a single user by ID."""
-        with self._lock:
-            conn = self._get_connection()
-            try:
-                row = conn.execute("SELECT * FROM users WHERE id=? AND active=1", (user_id,)).fetchone()
-                if row:
-                    return self._row_to_user(row)
-                return None
-            finally:
-                conn.close()
+        with self._reader() as conn:
+            row = conn.execute(SQL_GET_USER, (user_id,)).fetchone()
+            if row:
+                return self._row_to_user(row)
+            return None
 
     def get_user_by_fingerprint(self, fingerprint_id):
         """Look up a user by their fingerprint sensor ID."""
-        with self._lock:
-            conn = self._get_connection()
-            try:
-                row = conn.execute(
-                    "SELECT * FROM users WHERE fingerprint_id=? AND active=1",
-                    (fingerprint_id,)
-                ).fetchone()
-                if row:
-                    return self._row_to_user(row)
-                return None
-            finally:
-                conn.close()
+        with self._reader() as conn:
+            row = conn.execute(SQL_GET_USER_BY_FINGERPRINT, (fingerprint_id,)).fetchone()
+            if row:
+                return self._row_to_user(row)
+            return None
+
+    def get_user_by_fingerprint_light(self, fingerprint_id):
+        """
+        Look up just the id and name for a fingerprint sensor ID.
+
+        Served entirely from idx_users_fp_cov, without reading the user row
+        or its face encoding. Use this on the door path.
+
+        Returns:
+            dict: {id, name, fingerprint_id} or None.
+        """
+        with self._reader() as conn:
+            row = conn.execute(SQL_GET_USER_BY_FINGERPRINT_LIGHT, (fingerprint_id,)).fetchone()
+            return dict(row) if row else None
 
     def get_all_users(self):
         """Get all active users with their face encodings deserialized."""
-        with self._lock:
-            conn = self._get_connection()
-            try:
-                rows = conn.execute("SELECT * FROM users WHERE active=1").fetchall()
-                return [self._row_to_user(row) for row in rows]
-            finally:
-                conn.close()
+        return self._fetch_users(SQL_GET_ACTIVE_USERS)
+
+    def get_all_encodings_matrix(self):
+        """
+        Get every active user's face encoding packed into one matrix.
+
+        Returns:
+            tuple: (ids, names, encodings) — int64 array of user IDs, list of
+            names, and a contiguous (N, 128) float32 array whose rows line up
+            with them.
+        """
+        with self._reader() as conn:
+            rows = conn.execute(SQL_GET_ACTIVE_ENCODINGS).fetchall()
+
+        ids = np.fromiter((row["id"] for row in rows), dtype=np.int64, count=len(rows))
+        names = [row["name"] for row in rows]
+        packed = bytearray().join(row["face_encoding"] for row in rows)
+        encodings = np.frombuffer(packed, dtype=ENCODING_DTYPE).reshape(-1, ENCODING_DIM)
+        return ids, names, encodings.astype(np.float32, copy=False)
 
     def delete_user(self, user_id):
         """Soft-delete a user (mark inactive)."""
-        now = datetime.now().isoformat()
-        with self._lock:
-            conn = self._get_connection()
-            try:
-                conn.execute(
-                    "UPDATE users SET active=0, updated_at=?, synced=0 WHERE id=?",
-                    (now, user_id)
-                )
-                conn.execute(
-                    """INSERT INTO sync_queue (table_name, record_id, action, created_at)
-                       VALUES ('users', ?, 'delete', ?)""",
-                    (user_id, now)
-                )
-                conn.commit()
-                logger.info("User %d deactivated", user_id)
-            finally:
-                conn.close()
+        now = _now_iso()
+        with self._writer() as conn:
+            conn.execute(SQL_DEACTIVATE_USER, (now, user_id))
+            logger.info("User %d deactivated", user_id)
+
+    def _iter_query(self, sql, params, batch_size):
+        """Yield dict rows for a SELECT, fetching `batch_size` rows at a time."""
+        with self._reader() as conn:
+            cursor = conn.execute(sql, params)
+            while True:
+                batch = cursor.fetchmany(batch_size)
+                if not batch:
+                    break
+                for row in batch:
+                    yield dict(row)
+
+    def _iter_tuples(self, sql, params, batch_size):
+        """Yield plain tuple rows for a SELECT, `batch_size` rows at a time."""
+        with self._reader() as conn:
+            cursor = conn.cursor()
+            cursor.row_factory = None
+            cursor.execute(sql, params)
+            while True:
+                batch = cursor.fetchmany(batch_size)
+                if not batch:
+                    break
+                yield from batch
+
+    def _fetch_users(self, sql, params=()):
+        """
+        Run a users SELECT and build user dicts straight from tuples.
+
+        Skips the sqlite3.Row -> dict -> decoded copy chain used for single
+        lookups; each row becomes exactly one dict.
+        """
+        with self._reader() as conn:
+            cursor = conn.cursor()
+            cursor.row_factory = None
+            cursor.execute(sql, params)
+            columns = [d[0] for d in cursor.description]
+            users = []
+            for row in cursor:
+                user = dict(zip(columns, row))
+                if user["face_encoding"]:
+                    user["face_encoding"] = decode_face_encoding(user["face_encoding"])
+                users.append(user)
+        return users
 
     def _row_to_user(self, row):
         """Convert a database row to a user dict with deserialized encoding."""
         user = dict(row)
         if user.get("face_encoding"):
-            user["face_encoding"] = pickle.loads(user["face_encoding"])
+            user["face_encoding"] = decode_face_encoding(user["face_encoding"])
         return user
 
     # -------------------------------------------------------------------------
@@ -258,38 +652,42 @@ class Database:
 
     def save_fingerprint_template(self, user_id, fingerprint_id, template_data):
         """Back up a fingerprint template from the sensor to the local DB."""
-        now = datetime.now().isoformat()
-        blob = pickle.dumps(template_data) if template_data else None
+        self.save_fingerprint_templates_bulk([(user_id, fingerprint_id, template_data)])
+        logger.info("Fingerprint template backed up for user %d", user_id)
 
-        with self._lock:
-            conn = self._get_connection()
-            try:
-                conn.execute(
-                    """INSERT INTO fingerprint_backup
-                       (user_id, fingerprint_id, template_data, created_at)
-                       VALUES (?, ?, ?, ?)""",
-                    (user_id, fingerprint_id, blob, now)
-                )
-                conn.commit()
-                logger.info("Fingerprint template backed up for user %d", user_id)
-            finally:
-                conn.close()
+    def save_fingerprint_templates_bulk(self, items):
+        """
+        Back up many fingerprint templates in a single transaction.
+
+        Args:
+            items: iterable of (user_id, fingerprint_id, template_data) tuples.
+
+        Returns:
+            int: Number of templates saved.
+        """
+        now = _now_iso()
+        rows = [
+            (user_id, fingerprint_id,
+             encode_fingerprint_template(template_data), now)
+            for user_id, fingerprint_id, template_data in items
+        ]
+        if not rows:
+            return 0
+
+        with self._writer() as conn:
+            conn.executemany(SQL_INSERT_FINGERPRINT_BACKUP, rows)
+        return len(rows)
 
     def get_fingerprint_templates(self):
         """Get all backed-up fingerprint templates."""
-        with self._lock:
-            conn = self._get_connection()
-            try:
-                rows = conn.execute("SELECT * FROM fingerprint_backup").fetchall()
-                results = []
-                for row in rows:
-                    entry = dict(row)
-                    if entry.get("template_data"):
-                        entry["template_data"] = pickle.loads(entry["template_data"])
-                    results.append(entry)
-                return results
-            finally:
-                conn.close()
+        with self._reader() as conn:
+            rows = conn.execute(SQL_GET_FINGERPRINT_BACKUPS).fetchall()
+            results = []
+            for row in rows:
+                entry = dict(row)
+                entry["template_data"] = decode_fingerprint_template(entry["template_data"])
+                results.append(entry)
+            return results
 
     # -------------------------------------------------------------------------
     # Access Log Operations
@@ -300,6 +698,10 @@ class Database:
         """
         Log an access event.
 
+        The row is buffered and written by the flush thread within
+        `log_flush_interval` seconds, or sooner once `log_batch_size` events
+        are waiting. Call flush() to force it to disk.
+
         Args:
             user_id: ID of recognized user (None if unknown).
             user_name: Name of the user or 'Unknown'.
@@ -309,58 +711,162 @@ class Database:
             image_path: Path to the captured face image.
             confidence: Match confidence score (0.0-1.0).
         """
-        now = datetime.now().isoformat()
+        now = _now_iso()
+
+        with self._log_cond:
+            self._log_buf.append(
+                (user_id, user_name, method, direction, status,
+                 now, image_path, confidence)
+            )
+            if len(self._log_buf) >= self._log_batch_size:
+                self._log_cond.notify()
+        logger.info("Access log: %s %s via %s → %s", user_name, direction, method, status)
+
+    def flush(self):
+        """
+        Write all buffered access logs in a single transaction.
 
-        with self._lock:
-            conn = self._get_connection()
+        Returns:
+            int: Number of log rows written.
+        """
+        with self._log_cond:
+            rows = list(self._log_buf)
+            self._log_buf.clear()
+        if not rows:
+            return 0
+
+        try:
+            with self._writer() as conn:
+                conn.executemany(SQL_INSERT_ACCESS_LOG, rows)
+        except sqlite3.IntegrityError:
+            # A bad row would fail every retry; insert one at a time and
+            # drop only the rows the schema rejects
+            return self._flush_rows_individually(rows)
+        except sqlite3.Error:
+            # Put them back in front of anything logged meanwhile
+            with self._log_cond:
+                self._log_buf.extendleft(reversed(rows))
+            raise
+        return len(rows)
+
+    def _flush_rows_individually(self, rows):
+        """Insert buffered log rows one by one, skipping constraint failures."""
+        dropped = []
+        try:
+            with self._writer() as conn:
+                for row in rows:
+                    try:
+                        conn.execute(SQL_INSERT_ACCESS_LOG, row)
+                    except sqlite3.IntegrityError as e:
+                        dropped.append((row, e))
+        except sqlite3.Error:
+            # The rollback undid the good rows too; requeue the whole batch
+            with self._log_cond:
+                self._log_buf.extendleft(reversed(rows))
+            raise
+        for row, e in dropped:
+            logger.error("Dropping access log row %r: %s", row, e)
+        return len(rows) - len(dropped)
+
+    def _flush_before_read(self):
+        """
+        Flush buffered logs ahead of a read that must include them.
+
+        Only export and sync need that; a failure is logged rather than
+        raised, so the read still returns everything already committed.
+        """
+        try:
+            self.flush()
+        except sqlite3.Error as e:
+            logger.error("Access log flush before read failed: %s", e)
+
+    def _log_flush_loop(self):
+        """Background thread: flush the access-log buffer on size or age."""
+        while True:
+            with self._log_cond:
+                if not self._log_closed and len(self._log_buf) < self._log_batch_size:
+                    self._log_cond.wait(self._log_flush_interval)
+                if self._log_closed:
+                    return
             try:
-                cursor = conn.execute(
-                    """INSERT INTO access_logs
-                       (user_id, user_name, method, direction, status,
-                        timestamp, image_path, confidence)
-                       VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
-                    (user_id, user_name, method, direction, status,
-                     now, image_path, confidence)
-                )
-                log_id = cursor.lastrowid
-                conn.execute(
-                    """INSERT INTO sync_queue (table_name, record_id, action, created_at)
-                       VALUES ('access_logs', ?, 'create', ?)""",
-                    (log_id, now)
-                )
-                conn.commit()
-                logger.info("Access log: %s %s via %s → %s", user_name, direction, method, status)
-                return log_id
-            finally:
-                conn.close()
+                self.flush()
+            except sqlite3.Error as e:
+                logger.error("Access log flush failed: %s", e)
 
     def get_recent_logs(self, limit=50):
         """Get the most recent access logs."""
-        with self._lock:
-            conn = self._get_connection()
-            try:
-                rows = conn.execute(
-                    "SELECT * FROM access_logs ORDER BY timestamp DESC LIMIT ?",
-                    (limit,)
-                ).fetchall()
-                return [dict(row) for row in rows]
-            finally:
-                conn.close()
+        with self._reader() as conn:
+            rows = conn.execute(SQL_GET_RECENT_LOGS, (limit,)).fetchall()
+            return [dict(row) for row in rows]
+
+    def get_recent_log_lines(self, limit=50):
+        """
+        Get the most recent access logs as display-ready tuples.
+
+        Served entirely from idx_access_logs_ts_cov. The timestamp is cut
+        to seconds, user names to 14 and methods to 11 characters; a
+        missing user name reads 'Unknown' and a missing direction '?'.
+
+        Returns:
+            list: tuples in RECENT_LOG_LINE_COLUMNS order, newest first.
+        """
+        with self._reader() as conn:
+            cursor = conn.cursor()
+            cursor.row_factory = None
+            return cursor.execute(SQL_GET_RECENT_LOG_LINES, (limit,)).fetchall()
 
     def get_logs_by_date(self, start_date, end_date):
-        """Get access logs within a date range (ISO format strings)."""
-        with self._lock:
-            conn = self._get_connection()
-            try:
-                rows = conn.execute(
-                    """SELECT * FROM access_logs
-                       WHERE timestamp BETWEEN ? AND ?
-                       ORDER BY timestamp DESC""",
-                    (start_date, end_date)
-                ).fetchall()
-                return [dict(row) for row in rows]
-            finally:
-                conn.close()
+        """
+        Get access logs within a date range.
+
+        Args:
+            start_date: Inclusive lower bound (ISO format string).
+            end_date: Exclusive upper bound (ISO format string).
+        """
+        return list(self.iter_logs_by_date(start_date, end_date))
+
+    def iter_logs_by_date(self, start_date, end_date, batch_size=500):
+        """
+        Stream access logs within a date range, newest first.
+
+        Rows are pulled from the cursor in batches so large ranges never sit
+        in memory all at once. The pooled reader connection is held until the
+        generator is exhausted or closed.
+
+        Args:
+            start_date: Inclusive lower bound (ISO format string).
+            end_date: Exclusive upper bound (ISO format string).
+            batch_size: Rows fetched per cursor round trip.
+
+        Yields:
+            dict: One access log row.
+        """
+        yield from self._iter_query(SQL_GET_LOGS_BY_DATE, (start_date, end_date), batch_size)
+
+    def iter_log_rows(self, start_date=None, end_date=None, limit=10000, batch_size=1000):
+        """
+        Stream access logs as tuples in LOG_EXPORT_COLUMNS order, newest first.
+
+        Meant for bulk writers such as csv.writer: no dict is built per row.
+        A missing bound leaves that end of the range open; with neither
+        bound, the most recent `limit` rows are returned.
+
+        Args:
+            start_date: Inclusive lower bound (ISO format string).
+            end_date: Exclusive upper bound (ISO format string).
+            limit: Row cap when no date range is given.
+            batch_size: Rows fetched per cursor round trip.
+
+        Yields:
+            tuple: One access log row.
+        """
+        self._flush_before_read()
+        if start_date or end_date:
+            sql = SQL_EXPORT_LOGS_BY_DATE
+            params = (start_date or LOG_TIMESTAMP_MIN, end_date or LOG_TIMESTAMP_MAX)
+        else:
+            sql, params = SQL_EXPORT_RECENT_LOGS, (limit,)
+        yield from self._iter_tuples(sql, params, batch_size)
 
     # -------------------------------------------------------------------------
     # Sync Queue Operations
@@ -368,78 +874,64 @@ class Database:
 
     def get_pending_sync(self, table_name=None, limit=100):
         """Get pending sync items, optionally filtered by table."""
-        with self._lock:
-            conn = self._get_connection()
-            try:
-                if table_name:
-                    rows = conn.execute(
-                        """SELECT * FROM sync_queue
-                           WHERE table_name=? ORDER BY created_at ASC LIMIT ?""",
-                        (table_name, limit)
-                    ).fetchall()
-                else:
-                    rows = conn.execute(
-                        "SELECT * FROM sync_queue ORDER BY created_at ASC LIMIT ?",
-                        (limit,)
-                    ).fetchall()
-                return [dict(row) for row in rows]
-            finally:
-                conn.close()
+        with self._reader() as conn:
+            if table_name:
+                rows = conn.execute(
+                    SQL_GET_PENDING_SYNC_FOR_TABLE, (table_name, limit)
+                ).fetchall()
+            else:
+                rows = conn.execute(SQL_GET_PENDING_SYNC, (limit,)).fetchall()
+            return [dict(row) for row in rows]
 
     def mark_synced(self, table_name, record_id):
         """Mark a record as synced in its source table and remove from queue."""
-        with self._lock:
-            conn = self._get_connection()
-            try:
-                conn.execute(
-                    f"UPDATE {table_name} SET synced=1 WHERE id=?",
-                    (record_id,)
-                )
-                conn.execute(
-                    "DELETE FROM sync_queue WHERE table_name=? AND record_id=?",
-                    (table_name, record_id)
-                )
-                conn.commit()
-            finally:
-                conn.close()
+        self.mark_synced_many(table_name, [record_id])
+
+    def mark_synced_many(self, table_name, record_ids):
+        """
+        Mark a batch of records as synced in one transaction.
+
+        The fixed per-row statement is reused via executemany() rather than
+        building an `id IN (?, ?, ...)` list, so it stays in the statement
+        cache whatever the batch size; the fsync cost is per transaction
+        either way.
+
+        Args:
+            table_name: 'users', 'access_logs' or 'fingerprint_backup'.
+            record_ids: iterable of row IDs in that table.
+        """
+        sql = SQL_MARK_SYNCED.get(table_name)
+        if sql is None:
+            raise ValueError(f"Unknown sync table: {table_name!r}")
+
+        params = [(record_id,) for record_id in record_ids]
+        if not params:
+            return
+
+        with self._writer() as conn:
+            conn.executemany(sql, params)
+            conn.executemany(
+                SQL_DELETE_SYNC, [(table_name, record_id) for (record_id,) in params]
+            )
 
     def update_sync_attempt(self, queue_id):
         """Increment sync attempt counter."""
-        now = datetime.now().isoformat()
-        with self._lock:
-            conn = self._get_connection()
-            try:
-                conn.execute(
-                    "UPDATE sync_queue SET attempts=attempts+1, last_attempt=? WHERE id=?",
-                    (now, queue_id)
-                )
-                conn.commit()
-            finally:
-                conn.close()
+        now = _now_iso()
+        with self._writer() as conn:
+            conn.execute(SQL_UPDATE_SYNC_ATTEMPT, (now, queue_id))
 
     def get_unsynced_logs(self):
         """Get all access logs that haven't been synced."""
-        with self._lock:
-            conn = self._get_connection()
-            try:
-                rows = conn.execute(
-                    "SELECT * FROM access_logs WHERE synced=0 ORDER BY timestamp ASC"
-                ).fetchall()
-                return [dict(row) for row in rows]
-            finally:
-                conn.close()
+        return list(self.iter_unsynced_logs())
+
+    def iter_unsynced_logs(self, batch_size=500):
+        """Stream access logs that haven't been synced, oldest first."""
+        self._flush_before_read()
+        yield from self._iter_query(SQL_GET_UNSYNCED_LOGS, (), batch_size)
 
     def get_unsynced_users(self):
         """Get all users that haven't been synced."""
-        with self._lock:
-            conn = self._get_connection()
-            try:
-                rows = conn.execute(
-                    "SELECT * FROM users WHERE synced=0"
-                ).fetchall()
-                return [self._row_to_user(row) for row in rows]
-            finally:
-                conn.close()
+        return self._fetch_users(SQL_GET_UNSYNCED_USERS)
 
     # -------------------------------------------------------------------------
     # Stats
@@ -447,28 +939,50 @@ class Database:
 
     def get_stats(self):
         """Get summary statistics."""
-        with self._lock:
-            conn = self._get_connection()
-            try:
-                total_users = conn.execute(
-                    "SELECT COUNT(*) FROM users WHERE active=1"
-                ).fetchone()[0]
-                total_logs = conn.execute(
-                    "SELECT COUNT(*) FROM access_logs"
-                ).fetchone()[0]
-                pending_sync = conn.execute(
-                    "SELECT COUNT(*) FROM sync_queue"
-                ).fetchone()[0]
-                today = datetime.now().strftime("%Y-%m-%d")
-                today_access = conn.execute(
-                    "SELECT COUNT(*) FROM access_logs WHERE timestamp LIKE ?",
-                    (f"{today}%",)
-                ).fetchone()[0]
-                return {
-                    "total_users": total_users,
-                    "total_logs": total_logs,
-                    "pending_sync": pending_sync,
-                    "today_access": today_access
-                }
-            finally:
-                conn.close()
+        with self._reader() as conn:
+            total_users, total_logs, pending_sync, today_access = conn.execute(
+                SQL_GET_STATS, self._day_range()
+            ).fetchone()
+            return {
+                "total_users": total_users,
+                "total_logs": total_logs,
+                "pending_sync": pending_sync,
+                "today_access": today_access
+            }
+
+    def get_daily_counts(self, start_date, end_date):
+        """
+        Count access events in a time range, aggregated inside SQLite.
+
+        Args:
+            start_date: Inclusive ISO timestamp.
+            end_date: Exclusive ISO timestamp.
+
+        Returns:
+            dict: total, granted, denied, face, fingerprint, button counts.
+        """
+        with self._reader() as conn:
+            total, granted, denied, face, fingerprint, button = conn.execute(
+                SQL_GET_DAILY_COUNTS, (start_date, end_date)
+            ).fetchone()
+            return {
+                "total": total,
+                "granted": granted,
+                "denied": denied,
+                "face": face,
+                "fingerprint": fingerprint,
+                "button": button,
+            }
+
+    @staticmethod
+    def _day_range(day=None):
+        """
+        Half-open ISO timestamp bounds covering one calendar day.
+
+        Comparing `timestamp >= start AND timestamp < end` lets SQLite seek
+        idx_access_logs_ts_cov, which a `LIKE 'YYYY-MM-DD%'` cannot.
+        """
+        if day is None:
+            day = datetime.now().date()
+        start = datetime.combine(day, datetime.min.time())
+        return start.isoformat(), (start + timedelta(days=1)).isoformat()
@@ -6,13 +6,32 @@ All known encodings are cached in memory for fast lookup.
 """
 
 import os
-import pickle
+import sys
+import collections
+import math
+import queue
+import json
+import atexit
 import logging
+import threading
 import time
+import multiprocessing
 import numpy as np
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 
 logger = logging.getLogger(__name__)
 
+# Length of a dlib face embedding
+ENCODING_DIM = 128
+
+# recognize() scans known faces this many rows at a time and stops early on
+# a match within tolerance * EARLY_MATCH_FRACTION
+MATCH_BLOCK_ROWS = 64
+EARLY_MATCH_FRACTION = 0.6
+
+# Side of the square tile each face is scaled onto for batched enrollment
+ENROLL_TILE = 150
+
 try:
     import face_recognition
     FACE_RECOGNITION_AVAILABLE = True
@@ -28,6 +47,151 @@ except ImportError:
     logger.warning("OpenCV not installed. Camera capture disabled.")
 
 
+# -----------------------------------------------------------------------------
+# Encoder process pool
+# -----------------------------------------------------------------------------
+
+# dlib encodes on a single core, so extra faces (and enrollment samples) are
+# farmed out to worker processes. Start it from the main thread with
+# start_encoder_pool(); otherwise it is created on first use.
+_encoder_pool = None
+_encoder_pool_lock = threading.Lock()
+
+# Scheduling state of the process at import (on the main thread), before
+# RecognitionWorker pins and re-nices its threads. Forked encoder workers
+# reset to this, so they aren't confined to the recognizer's cores.
+_BASE_AFFINITY = os.sched_getaffinity(0) if hasattr(os, "sched_getaffinity") else None
+try:
+    _BASE_NICE = os.nice(0)
+except (OSError, AttributeError):
+    _BASE_NICE = None
+
+
+def _init_encoder_worker():
+    """Undo the CPU affinity and nice inherited from the forking thread."""
+    if _BASE_AFFINITY:
+        try:
+            os.sched_setaffinity(0, _BASE_AFFINITY)
+        except OSError:
+            pass
+    if _BASE_NICE is not None:
+        try:
+            current = os.nice(0)
+            if current < _BASE_NICE:
+                os.nice(_BASE_NICE - current)
+        except OSError:
+            pass
+
+
+def _encode_face(rgb_frame, location, num_jitters):
+    """Compute the 128-d float32 encoding for one face box (runs in a worker)."""
+    return face_recognition.face_encodings(
+        rgb_frame, known_face_locations=[location], num_jitters=num_jitters
+    )[0].astype(np.float32)
+
+
+def _face_tile(rgb_frame, location, size=ENROLL_TILE):
+    """
+    Cut one face out of a frame onto a size x size tile.
+
+    The box plus a margin is scaled to fit the tile (the rest is black
+    padding) so several faces can be laid out on one grid image.
+
+    Returns:
+        tuple: (tile, location) with the box in tile coordinates.
+    """
+    top, right, bottom, left = location
+    height, width = rgb_frame.shape[:2]
+    margin = (bottom - top) // 4
+    t0, b0 = max(0, top - margin), min(height, bottom + margin)
+    l0, r0 = max(0, left - margin), min(width, right + margin)
+
+    crop = rgb_frame[t0:b0, l0:r0]
+    scale = size / max(crop.shape[0], crop.shape[1])
+    crop = cv2.resize(crop, (max(1, int(crop.shape[1] * scale)), max(1, int(crop.shape[0] * scale))))
+
+    tile = np.zeros((size, size, 3), dtype=rgb_frame.dtype)
+    tile[:crop.shape[0], :crop.shape[1]] = crop
+    box = (
+        int((top - t0) * scale), int((right - l0) * scale),
+        int((bottom - t0) * scale), int((left - l0) * scale),
+    )
+    return tile, box
+
+
+def _encode_tiles(tiles, num_jitters):
+    """
+    Encode many face tiles with a single face_encodings call.
+
+    Tiles are laid out on a square grid and every box is passed in grid
+    coordinates, so the Python/dlib boundary is crossed once per batch.
+
+    Args:
+        tiles: list of (tile, location) from _face_tile.
+        num_jitters: dlib re-sampling count.
+
+    Returns:
+        list: float32 encodings, in tile order.
+    """
+    if not tiles:
+        return []
+    size = tiles[0][0].shape[0]
+    cols = math.ceil(math.sqrt(len(tiles)))
+    rows = math.ceil(len(tiles) / cols)
+    grid = np.zeros((rows * size, cols * size, 3), dtype=tiles[0][0].dtype)
+
+    locations = []
+    for i, (tile, (top, right, bottom, left)) in enumerate(tiles):
+        y, x = (i // cols) * size, (i % cols) * size
+        grid[y:y + size, x:x + size] = tile
+        locations.append((top + y, right + x, bottom + y, left + x))
+
+    return [
+        encoding.astype(np.float32)
+        for encoding in face_recognition.face_encodings(
+            grid, known_face_locations=locations, num_jitters=num_jitters
+        )
+    ]
+
+
+def _get_encoder_pool(max_workers=None):
+    """
+    Return the shared encoder pool, creating it on first call.
+
+    Args:
+        max_workers: Worker processes (default: one per CPU core).
+
+    Returns:
+        ProcessPoolExecutor or None if one cannot be started.
+    """
+    global _encoder_pool
+    with _encoder_pool_lock:
+        if _encoder_pool is None:
+            # fork hands the already-imported dlib to the workers on Linux
+            ctx = None
+            if sys.platform.startswith("linux"):
+                ctx = multiprocessing.get_context("fork")
+            try:
+                _encoder_pool = ProcessPoolExecutor(
+                    max_workers=max_workers or os.cpu_count() or 1,
+                    mp_context=ctx,
+                    initializer=_init_encoder_worker,
+                )
+            except (OSError, ValueError) as e:
+                logger.warning("Encoder process pool unavailable (%s) — encoding inline", e)
+                return None
+            atexit.register(_encoder_pool.shutdown, wait=False)
+            # With fork, every worker is started on the first submit; do it
+            # now so they fork from the creating thread, not a later caller
+            try:
+                _encoder_pool.submit(os.getpid).result()
+            except Exception as e:
+                logger.warning("Encoder process pool failed to start (%s) — encoding inline", e)
+                _encoder_pool.shutdown(wait=False)
+                _encoder_pool = None
+        return _encoder_pool
+
+
 class FaceRecognitionModule:
     """Handle face detection, encoding, and matching."""
 
@@ -40,14 +204,67 @@ class FaceRecognitionModule:
         self.tolerance = config.get("tolerance", 0.5)
         self.num_jitters = config.get("num_jitters", 1)
         self.enrollment_samples = config.get("enrollment_samples", 5)
+        # Enrollment drops samples farther than this from the running mean
+        self.enrollment_outlier_distance = config.get("enrollment_outlier_distance", 0.6)
         self.min_face_size = config.get("min_face_size", 40)
-        self.cache_file = config.get("encodings_cache_file", "data/encodings_cache.pkl")
+        # dlib detection runs on a frame shrunk by this factor; boxes are
+        # scaled back so encoding still uses the full-resolution frame
+        self.detection_downscale = config.get("detection_downscale", 0.5)
+        # Encoder worker processes: 0 = one per core, 1 = encode inline
+        self.encoder_workers = config.get("encoder_workers", 0)
+        # RecognitionWorker thread placement (Linux only; empty = no pinning)
+        self.grabber_cpus = config.get("grabber_cpus", [1])
+        self.recognizer_cpus = config.get("recognizer_cpus", [2, 3])
+        self.recognizer_nice = config.get("recognizer_nice", -5)
+        # (N, 128) float32 .npy; ids/names go in a .json next to it
+        self.cache_file = config.get("encodings_cache_file", "data/encodings_cache.npy")
+        self.cache_meta_file = os.path.splitext(self.cache_file)[0] + ".json"
+
+        # Face detector: dlib HOG/CNN via face_recognition, or an OpenCV model
+        # ("opencv_dnn" = res10 SSD, "yunet" = FaceDetectorYN). dlib still
+        # computes the 128-d embeddings either way.
+        self.detector_backend = config.get("detector_backend", "hog")
+        self.detector_confidence = config.get("detector_confidence", 0.5)
+        self.dnn_prototxt = config.get("dnn_prototxt", "models/deploy.prototxt")
+        self.dnn_model = config.get(
+            "dnn_model", "models/res10_300x300_ssd_iter_140000.caffemodel"
+        )
+        self.yunet_model = config.get("yunet_model", "models/face_detection_yunet_2023mar.onnx")
+        self._detector = None
+        self._load_detector()
+
+        # Reused conversion targets: cvtColor/resize write into these instead
+        # of allocating ~900 KB per 640x480 frame. Reallocated on shape change.
+        self._rgb_buf = None
+        self._small_buf = None
+
+        # One thread scores frame k while capture_and_recognize grabs k+1
+        self._score_pool = None
+
+        # save_face_image state: directories already created, cached
+        # per-second filename prefix, and JPEG encoder settings
+        self._save_lock = threading.Lock()
+        self._ensured_dirs = set()
+        self._stamp_second = None
+        self._stamp_prefix = ""
+        self._stamp_seq = 0
+        self.jpeg_quality = config.get("jpeg_quality", 85)
+        self._jpeg_params = [cv2.IMWRITE_JPEG_QUALITY, int(self.jpeg_quality)] if OPENCV_AVAILABLE else []
 
         # In-memory cache: {user_id: (name, encoding_128d)}
         self._known_encodings = {}
         self._known_ids = []
         self._known_names = []
-        self._known_enc_array = []
+        # Contiguous (N, 128) float32 matrix, row i belongs to _known_ids[i]
+        self._known_enc_matrix = np.empty((0, ENCODING_DIM), dtype=np.float32)
+        # Same rows scaled to unit length, for dot-product matching
+        self._known_enc_unit = self._known_enc_matrix
+        # (ids, names, unit matrix) bound as one tuple so a recognizer thread
+        # never pairs rows from one load with IDs from another
+        self._match_index = ([], [], self._known_enc_unit)
+        # Held while the known-face attributes are rebound (full loads and
+        # add/remove) and while the cache writer snapshots them
+        self._known_lock = threading.Lock()
 
     def load_known_faces(self, users):
         """
@@ -56,23 +273,107 @@ class FaceRecognitionModule:
         Args:
             users: list of user dicts from Database.get_all_users()
         """
-        self._known_encodings = {}
-        self._known_ids = []
-        self._known_names = []
-        self._known_enc_array = []
+        ids = []
+        names = []
+        encodings = []
 
         for user in users:
             if user.get("face_encoding") is not None:
-                uid = user["id"]
-                name = user["name"]
-                encoding = user["face_encoding"]
-                self._known_encodings[uid] = (name, encoding)
-                self._known_ids.append(uid)
-                self._known_names.append(name)
-                self._known_enc_array.append(encoding)
+                ids.append(user["id"])
+                names.append(user["name"])
+                encodings.append(user["face_encoding"])
 
+        self._set_known_faces(ids, names, encodings)
         logger.info("Loaded %d known face encodings into memory", len(self._known_ids))
 
+    def load_known_encodings(self, ids, names, encodings):
+        """
+        Load known faces from a pre-stacked encoding matrix.
+
+        Args:
+            ids: sequence of user IDs, one per row of `encodings`.
+            names: list of user names, one per row of `encodings`.
+            encodings: (N, 128) float32 array from Database.get_all_encodings_matrix().
+        """
+        self._set_known_faces([int(uid) for uid in ids], list(names), encodings)
+        logger.info("Loaded %d known face encodings into memory", len(self._known_ids))
+
+    def _set_known_faces(self, ids, names, encodings):
+        """Install known faces, stacking encodings into one float32 matrix."""
+        if isinstance(encodings, np.ndarray) and encodings.ndim == 2:
+            # Already a matrix (possibly memory-mapped): no copy if float32
+            matrix = np.ascontiguousarray(encodings, dtype=np.float32)
+        elif len(encodings):
+            matrix = np.ascontiguousarray(np.vstack(encodings), dtype=np.float32)
+        else:
+            matrix = np.empty((0, ENCODING_DIM), dtype=np.float32)
+
+        unit = self._unit_rows(matrix)
+        with self._known_lock:
+            self._publish_known_faces(ids, names, matrix, unit)
+
+    @staticmethod
+    def _unit_rows(matrix):
+        """Scale each row of a float32 matrix to unit length."""
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        unit = matrix / np.maximum(norms, np.finfo(np.float32).tiny)
+        return np.ascontiguousarray(unit, dtype=np.float32)
+
+    def _publish_known_faces(self, ids, names, matrix, unit):
+        """Rebind every known-face attribute to freshly built objects."""
+        self._known_ids = ids
+        self._known_names = names
+        self._known_enc_matrix = matrix
+        self._known_enc_unit = unit
+        self._known_encodings = {
+            uid: (name, matrix[i]) for i, (uid, name) in enumerate(zip(ids, names))
+        }
+        self._match_index = (ids, names, unit)
+
+    def add_known_face(self, user_id, name, encoding):
+        """
+        Add (or replace) one known face without reloading the rest.
+
+        Args:
+            user_id: User ID.
+            name: User name.
+            encoding: 128-d face encoding.
+        """
+        row = np.asarray(encoding, dtype=np.float32).reshape(1, ENCODING_DIM)
+        with self._known_lock:
+            ids, names = self._known_ids, self._known_names
+            if user_id in self._known_encodings:
+                i = ids.index(user_id)
+                matrix = self._known_enc_matrix.copy()
+                unit = self._known_enc_unit.copy()
+                matrix[i] = row
+                unit[i] = self._unit_rows(row)
+                names = names[:i] + [name] + names[i + 1:]
+            else:
+                matrix = np.vstack([self._known_enc_matrix, row])
+                unit = np.vstack([self._known_enc_unit, self._unit_rows(row)])
+                ids = ids + [user_id]
+                names = names + [name]
+            self._publish_known_faces(list(ids), names, matrix, unit)
+
+    def remove_known_face(self, user_id):
+        """
+        Drop one known face, if present.
+
+        Args:
+            user_id: User ID.
+        """
+        with self._known_lock:
+            if user_id not in self._known_encodings:
+                return
+            keep = np.array([uid != user_id for uid in self._known_ids], dtype=bool)
+            self._publish_known_faces(
+                [uid for uid in self._known_ids if uid != user_id],
+                [n for uid, n in zip(self._known_ids, self._known_names) if uid != user_id],
+                np.ascontiguousarray(self._known_enc_matrix[keep]),
+                np.ascontiguousarray(self._known_enc_unit[keep]),
+            )
+
     def capture_frame(self, camera):
         """
         Capture a single frame from the camera.
@@ -101,39 +402,176 @@ class FaceRecognitionModule:
             frame: BGR numpy array from OpenCV.
 
         Returns:
-            tuple: (encodings_list, locations_list)
+            tuple: (encodings_list, locations_list); encodings are float32.
         """
-        if not FACE_RECOGNITION_AVAILABLE:
+        rgb_frame, filtered_locations = self._locate_faces(frame)
+        if not filtered_locations:
             return [], []
 
-        # Convert BGR to RGB for face_recognition
-        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        pool = self._encoder_pool() if len(filtered_locations) > 1 else None
+        if pool is not None:
+            # One face per worker process
+            futures = [
+                pool.submit(_encode_face, rgb_frame, location, self.num_jitters)
+                for location in filtered_locations
+            ]
+            encodings = [future.result() for future in futures]
+        else:
+            encodings = [
+                encoding.astype(np.float32)
+                for encoding in face_recognition.face_encodings(
+                    rgb_frame,
+                    known_face_locations=filtered_locations,
+                    num_jitters=self.num_jitters
+                )
+            ]
 
-        # Detect face locations
-        face_locations = face_recognition.face_locations(rgb_frame, model=self.model)
+        return encodings, filtered_locations
 
-        if not face_locations:
-            return [], []
+    def _locate_faces(self, frame):
+        """
+        Detect faces big enough to encode.
+
+        Args:
+            frame: BGR numpy array from OpenCV.
+
+        Returns:
+            tuple: (rgb_frame, locations_list); rgb_frame is None and
+            locations empty when no usable face was found.
+        """
+        if not FACE_RECOGNITION_AVAILABLE:
+            return None, []
+
+        # HOG takes the strongest gradient over the three channels, so it
+        # sees the same image in BGR; only the CNN detector needs RGB.
+        # The OpenCV detectors take BGR themselves.
+        rgb_frame = None
+        if self._detector is None and self.model != "hog":
+            rgb_frame = self._to_rgb(frame)
 
-        # Filter small faces
+        # Detect face locations
+        face_locations = self._detect_faces(frame, rgb_frame if rgb_frame is not None else frame)
+
+        # Filter small faces: one mask over the (F, 4) box array
         filtered_locations = []
-        for (top, right, bottom, left) in face_locations:
-            face_height = bottom - top
-            face_width = right - left
-            if face_height >= self.min_face_size and face_width >= self.min_face_size:
-                filtered_locations.append((top, right, bottom, left))
+        if len(face_locations):
+            locs = np.asarray(face_locations, dtype=np.int32).reshape(-1, 4)
+            heights = locs[:, 2] - locs[:, 0]
+            widths = locs[:, 1] - locs[:, 3]
+            mask = (heights >= self.min_face_size) & (widths >= self.min_face_size)
+            # tolist() gives plain ints, which dlib.rectangle requires
+            filtered_locations = [tuple(row) for row in locs[mask].tolist()]
 
         if not filtered_locations:
-            return [], []
+            # Most frames have no face: skip the full-frame conversion
+            return None, []
 
-        # Generate encodings
-        encodings = face_recognition.face_encodings(
-            rgb_frame,
-            known_face_locations=filtered_locations,
-            num_jitters=self.num_jitters
-        )
+        # The encoder does need true RGB
+        if rgb_frame is None:
+            rgb_frame = self._to_rgb(frame)
+        return rgb_frame, filtered_locations
 
-        return encodings, filtered_locations
+    def _to_rgb(self, frame):
+        """Convert a BGR frame to RGB into the reused buffer."""
+        if self._rgb_buf is None or self._rgb_buf.shape != frame.shape:
+            self._rgb_buf = np.empty_like(frame)
+        return cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=self._rgb_buf)
+
+    def start_encoder_pool(self):
+        """
+        Start the encoder worker processes now.
+
+        Call from the main thread before RecognitionWorker starts, so the
+        workers are forked before any thread is pinned or re-niced.
+        """
+        self._encoder_pool()
+
+    def _encoder_pool(self):
+        """Shared encoder pool, or None when configured to encode inline."""
+        if self.encoder_workers == 1 or not FACE_RECOGNITION_AVAILABLE:
+            return None
+        return _get_encoder_pool(self.encoder_workers or None)
+
+    def _load_detector(self):
+        """Load the configured OpenCV face detector, falling back to dlib."""
+        if self.detector_backend in ("hog", "cnn"):
+            self.model = self.detector_backend
+            return
+        if not OPENCV_AVAILABLE:
+            logger.warning("OpenCV not available — using dlib %s detector", self.model)
+            self.detector_backend = self.model
+            return
+
+        try:
+            if self.detector_backend == "opencv_dnn":
+                self._detector = cv2.dnn.readNetFromCaffe(self.dnn_prototxt, self.dnn_model)
+            elif self.detector_backend == "yunet":
+                self._detector = cv2.FaceDetectorYN.create(
+                    self.yunet_model, "", (320, 320), self.detector_confidence
+                )
+            else:
+                raise ValueError(f"unknown detector_backend {self.detector_backend!r}")
+            logger.info("Face detector: %s", self.detector_backend)
+        except (cv2.error, ValueError, AttributeError) as e:
+            logger.warning(
+                "Could not load %s face detector (%s) — using dlib %s",
+                self.detector_backend, e, self.model
+            )
+            self._detector = None
+            self.detector_backend = self.model
+
+    def _detect_faces(self, frame, dlib_frame):
+        """
+        Find faces with the configured backend.
+
+        Args:
+            frame: BGR frame, used by the OpenCV detectors.
+            dlib_frame: Frame for dlib; BGR is fine for HOG, CNN needs RGB.
+
+        Returns:
+            list: (top, right, bottom, left) boxes, as face_recognition uses.
+        """
+        if self._detector is None:
+            scale = self.detection_downscale
+            if not 0.0 < scale < 1.0:
+                return face_recognition.face_locations(dlib_frame, model=self.model)
+            height, width = dlib_frame.shape[:2]
+            size = (max(1, int(round(width * scale))), max(1, int(round(height * scale))))
+            if self._small_buf is None or self._small_buf.shape[1::-1] != size:
+                self._small_buf = np.empty((size[1], size[0], 3), dtype=dlib_frame.dtype)
+            small = cv2.resize(dlib_frame, size, dst=self._small_buf)
+            return [
+                tuple(int(round(v / scale)) for v in location)
+                for location in face_recognition.face_locations(small, model=self.model)
+            ]
+
+        height, width = frame.shape[:2]
+        boxes = []
+
+        if self.detector_backend == "yunet":
+            self._detector.setInputSize((width, height))
+            _, faces = self._detector.detect(frame)
+            if faces is None:
+                return []
+            for x, y, w, h in faces[:, :4]:
+                boxes.append((y, x + w, y + h, x))
+        else:
+            blob = cv2.dnn.blobFromImage(
+                cv2.resize(frame, (300, 300)), 1.0, (300, 300), (104.0, 177.0, 123.0)
+            )
+            self._detector.setInput(blob)
+            detections = self._detector.forward()[0, 0]
+            scale = np.array([width, height, width, height], dtype=np.float32)
+            for det in detections[detections[:, 2] > self.detector_confidence]:
+                left, top, right, bottom = det[3:7] * scale
+                boxes.append((top, right, bottom, left))
+
+        # Clamp to the frame and convert to the int tuples dlib expects
+        return [
+            (max(0, int(top)), min(width, int(right)),
+             min(height, int(bottom)), max(0, int(left)))
+            for top, right, bottom, left in boxes
+        ]
 
     def recognize(self, frame):
         """
@@ -145,7 +583,9 @@ class FaceRecognitionModule:
         Returns:
             dict or None: {user_id, name, confidence, face_location} if matched.
         """
-        if not self._known_enc_array:
+        # Single read: a concurrent reload rebinds the tuple, never mutates it
+        known_ids, known_names, known_unit = self._match_index
+        if not known_ids:
             logger.debug("No known faces loaded")
             return None
 
@@ -155,21 +595,26 @@ class FaceRecognitionModule:
             logger.debug("No faces detected in frame")
             return None
 
+        # dlib embeddings are close to unit length, so compare unit vectors:
+        # ||a - b||^2 = 2 - 2 a.b, and one matrix-vector product (BLAS
+        # SGEMV) scores every known face. Tolerance becomes a similarity floor.
+        sim_threshold = 1.0 - (self.tolerance ** 2) / 2.0
+        # A hit this close is unambiguous, so the scan can stop there
+        early_sim = 1.0 - ((self.tolerance * EARLY_MATCH_FRACTION) ** 2) / 2.0
+        best_sim_seen = -math.inf
+
         # Check each detected face against known encodings
         for encoding, location in zip(encodings, locations):
-            # Compute distances to all known faces
-            distances = face_recognition.face_distance(self._known_enc_array, encoding)
-
-            if len(distances) == 0:
-                continue
-
-            best_idx = np.argmin(distances)
-            best_distance = distances[best_idx]
-            confidence = 1.0 - best_distance
-
-            if best_distance <= self.tolerance:
-                user_id = self._known_ids[best_idx]
-                user_name = self._known_names[best_idx]
+            query = encoding.astype(np.float32, copy=False)
+            query = query / max(float(np.linalg.norm(query)), 1e-12)
+            best_idx, best_sim = self._best_match(known_unit, query, early_sim)
+            best_sim_seen = max(best_sim_seen, best_sim)
+
+            if best_sim >= sim_threshold:
+                best_distance = self._sim_to_distance(best_sim)
+                confidence = 1.0 - best_distance
+                user_id = known_ids[best_idx]
+                user_name = known_names[best_idx]
                 logger.info(
                     "Face matched: %s (ID=%d) confidence=%.3f",
                     user_name, user_id, confidence
@@ -182,44 +627,86 @@ class FaceRecognitionModule:
                     "distance": best_distance
                 }
 
-        logger.info("Face detected but no match (best distance: %.3f)", float(np.min(distances)))
+        # best_sim_seen spans every detected face, not just the last one
+        logger.info(
+            "Face detected but no match (best distance: %.3f over %d faces)",
+            self._sim_to_distance(best_sim_seen), len(encodings)
+        )
         return None
 
+    @staticmethod
+    def _best_match(known_unit, query, early_sim):
+        """
+        Find the most similar known row, scanning in blocks.
+
+        Each block is one GEMV; scanning stops after the first block that
+        holds a row at or above `early_sim`, so a confident hit touches
+        only part of the matrix.
+
+        Returns:
+            tuple: (row index, similarity)
+        """
+        best_idx = 0
+        best_sim = -math.inf
+        for start in range(0, known_unit.shape[0], MATCH_BLOCK_ROWS):
+            sims = known_unit[start:start + MATCH_BLOCK_ROWS] @ query
+            idx = int(np.argmax(sims))
+            sim = float(sims[idx])
+            if sim > best_sim:
+                best_idx, best_sim = start + idx, sim
+            if best_sim >= early_sim:
+                break
+        return best_idx, best_sim
+
+    @staticmethod
+    def _sim_to_distance(similarity):
+        """Euclidean distance between unit vectors with this dot product."""
+        return math.sqrt(max(0.0, 2.0 - 2.0 * similarity))
+
     def capture_and_recognize(self, camera, num_attempts=3, delay=0.5):
         """
         Capture multiple frames and attempt recognition.
 
         Tries multiple captures to account for camera warmup and lighting.
+        Each frame is scored on a worker thread while the next one is read
+        (camera.read() and dlib both release the GIL).
 
         Args:
             camera: cv2.VideoCapture instance.
             num_attempts: Number of frames to try.
-            delay: Seconds between attempts.
+            delay: Seconds to wait after a failed capture.
 
         Returns:
             tuple: (result_dict or None, best_frame or None)
         """
+        if self._score_pool is None:
+            self._score_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="face-score")
+
         best_result = None
         best_frame = None
-        best_confidence = 0.0
-
-        for attempt in range(num_attempts):
-            frame = self.capture_frame(camera)
+        pending = None  # (future, frame) still being scored
+
+        for attempt in range(num_attempts + 1):
+            frame = None
+            if attempt < num_attempts:
+                frame = self.capture_frame(camera)
+
+            if pending is not None:
+                future, scored_frame = pending
+                pending = None
+                result = future.result()
+                if result:
+                    # Found a good match, no need to keep trying
+                    best_result, best_frame = result, scored_frame
+                    break
+
+            if attempt == num_attempts:
+                break
             if frame is None:
                 time.sleep(delay)
                 continue
 
-            result = self.recognize(frame)
-            if result and result["confidence"] > best_confidence:
-                best_result = result
-                best_frame = frame.copy()
-                best_confidence = result["confidence"]
-
-            if best_result:
-                # Found a good match, no need to keep trying
-                break
-
-            time.sleep(delay)
+            pending = (self._score_pool.submit(self.recognize, frame), frame.copy())
 
         return best_result, best_frame
 
@@ -238,43 +725,101 @@ class FaceRecognitionModule:
         if num_samples is None:
             num_samples = self.enrollment_samples
 
-        encodings = []
         frames = []
         attempts = 0
         max_attempts = num_samples * 3  # Allow retries
+        pool = self._encoder_pool()
+
+        # Running sums instead of a list of samples; a sample far from the
+        # mean so far (bad light, head turned away) is dropped
+        acc = np.zeros(ENCODING_DIM, dtype=np.float32)
+        sq_acc = np.zeros(ENCODING_DIM, dtype=np.float32)
+        accepted = 0
+        pending = collections.deque()  # (future or face tile, frame)
+
+        def fold(encoding, sample_frame):
+            nonlocal accepted
+            if accepted >= 2:
+                dist = float(np.linalg.norm(encoding - acc / accepted))
+                if dist > self.enrollment_outlier_distance:
+                    logger.warning("Enrollment sample rejected (%.3f from mean)", dist)
+                    return
+            np.add(acc, encoding, out=acc)
+            np.add(sq_acc, encoding * encoding, out=sq_acc)
+            accepted += 1
+            frames.append(sample_frame)
 
         logger.info("Starting face enrollment — capturing %d samples", num_samples)
 
-        while len(encodings) < num_samples and attempts < max_attempts:
+        def settle(wait):
+            # Pool: fold finished futures in order (or the oldest, waiting).
+            # Inline: encode everything queued with one dlib call.
+            if pool is None:
+                batch = [pending.popleft() for _ in range(len(pending))]
+                encodings = _encode_tiles([tile for tile, _ in batch], self.num_jitters)
+                for encoding, (_, sample_frame) in zip(encodings, batch):
+                    fold(encoding, sample_frame)
+                return
+            while pending and (wait or pending[0][0].done()):
+                future, sample_frame = pending.popleft()
+                fold(future.result(), sample_frame)
+                wait = False
+
+        while accepted < num_samples and attempts < max_attempts:
+            if accepted + len(pending) >= num_samples:
+                # Enough in flight: settle before capturing more
+                settle(wait=True)
+                continue
+
             attempts += 1
             frame = self.capture_frame(camera)
             if frame is None:
                 time.sleep(delay)
                 continue
 
-            face_encodings, face_locations = self.detect_and_encode(frame)
-
-            if len(face_encodings) == 1:
-                encodings.append(face_encodings[0])
-                frames.append(frame.copy())
+            rgb_frame, face_locations = self._locate_faces(frame)
+            if pool is not None and face_locations:
+                # The task is pickled after submit() returns; detach it from
+                # the RGB buffer the next capture will overwrite
+                rgb_frame = rgb_frame.copy()
+
+            if len(face_locations) == 1:
+                if pool is not None:
+                    # Sample k encodes in a worker while sample k+1 is captured
+                    item = pool.submit(
+                        _encode_face, rgb_frame, face_locations[0], self.num_jitters
+                    )
+                else:
+                    # Keep just the face tile; all tiles encode in one batch
+                    item = _face_tile(rgb_frame, face_locations[0])
+                pending.append((item, frame.copy()))
                 logger.info(
                     "Enrollment sample %d/%d captured",
-                    len(encodings), num_samples
+                    accepted + len(pending), num_samples
                 )
-            elif len(face_encodings) > 1:
+            elif len(face_locations) > 1:
                 logger.warning("Multiple faces detected — show only one face")
             else:
                 logger.debug("No face detected, attempt %d/%d", attempts, max_attempts)
 
+            if pool is not None:
+                settle(wait=False)
+
             time.sleep(delay)
 
-        if len(encodings) < 2:
-            logger.error("Enrollment failed — insufficient samples (%d)", len(encodings))
+        while pending:
+            settle(wait=True)
+
+        if accepted < 2:
+            logger.error("Enrollment failed — insufficient samples (%d)", accepted)
             return None, []
 
-        # Compute average encoding
-        avg_encoding = np.mean(encodings, axis=0)
-        logger.info("Face enrollment complete — %d samples averaged", len(encodings))
+        avg_encoding = acc / accepted
+        spread = float(np.sqrt(np.maximum(sq_acc / accepted - avg_encoding ** 2, 0.0)).mean())
+        logger.info(
+            "Face enrollment complete — %d samples averaged (spread %.4f)",
+            accepted, spread
+        )
         return avg_encoding, frames
 
     def save_face_image(self, frame, user_id, images_dir="data/faces"):
@@ -293,39 +838,79 @@ class FaceRecognitionModule:
             return None
 
         user_dir = os.path.join(images_dir, str(user_id))
-        os.makedirs(user_dir, exist_ok=True)
-
-        timestamp = time.strftime("%Y%m%d_%H%M%S")
-        filename = f"face_{timestamp}.jpg"
-        filepath = os.path.join(user_dir, filename)
+        # Saves may come from several threads; names must stay unique
+        with self._save_lock:
+            if user_dir not in self._ensured_dirs:
+                os.makedirs(user_dir, exist_ok=True)
+                self._ensured_dirs.add(user_dir)
+
+            # strftime once per second; the sequence number keeps several
+            # saves within the same second from overwriting each other
+            now = int(time.time())
+            if now != self._stamp_second:
+                self._stamp_second = now
+                self._stamp_prefix = time.strftime("%Y%m%d_%H%M%S", time.localtime(now))
+                self._stamp_seq = 0
+            else:
+                self._stamp_seq += 1
+            filename = f"face_{self._stamp_prefix}_{self._stamp_seq:02d}.jpg"
+            filepath = os.path.join(user_dir, filename)
 
-        cv2.imwrite(filepath, frame)
+        cv2.imwrite(filepath, frame, self._jpeg_params)
         logger.debug("Saved face image: %s", filepath)
         return filepath
 
     def save_encodings_cache(self):
-        """Save current known encodings to a pickle cache file."""
+        """Save current known encodings as a .npy matrix plus a JSON index."""
         cache_dir = os.path.dirname(self.cache_file)
         if cache_dir:
             os.makedirs(cache_dir, exist_ok=True)
 
-        with open(self.cache_file, "wb") as f:
-            pickle.dump(self._known_encodings, f)
+        # Write both files under temp names and rename, so a crash never
+        # leaves a matrix that disagrees with its index
+        tmp_npy = self.cache_file + ".tmp"
+        tmp_meta = self.cache_meta_file + ".tmp"
+        # One consistent snapshot; a concurrent add/remove rebinds all three
+        with self._known_lock:
+            ids, names, matrix = self._known_ids, self._known_names, self._known_enc_matrix
+        with open(tmp_npy, "wb") as f:
+            np.save(f, np.ascontiguousarray(matrix, dtype=np.float32))
+        with open(tmp_meta, "w") as f:
+            json.dump(
+                [{"id": uid, "name": name} for uid, name in zip(ids, names)],
+                f,
+            )
+        os.replace(tmp_npy, self.cache_file)
+        os.replace(tmp_meta, self.cache_meta_file)
         logger.info("Encodings cache saved to %s", self.cache_file)
 
     def load_encodings_cache(self):
-        """Load known encodings from pickle cache (fast startup)."""
-        if os.path.exists(self.cache_file):
-            with open(self.cache_file, "rb") as f:
-                self._known_encodings = pickle.load(f)
-
-            self._known_ids = list(self._known_encodings.keys())
-            self._known_names = [v[0] for v in self._known_encodings.values()]
-            self._known_enc_array = [v[1] for v in self._known_encodings.values()]
+        """Load known encodings from the .npy cache (fast startup)."""
+        if not (os.path.exists(self.cache_file) and os.path.exists(self.cache_meta_file)):
+            return False
+
+        try:
+            # Memory-mapped: the OS pages rows in as they are first read
+            matrix = np.load(self.cache_file, mmap_mode="r")
+            with open(self.cache_meta_file, "r") as f:
+                meta = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning("Ignoring unreadable encodings cache: %s", e)
+            return False
+
+        if matrix.ndim != 2 or matrix.shape[0] != len(meta) or (
+                len(meta) and matrix.shape[1] != ENCODING_DIM):
+            logger.warning("Encodings cache index does not match matrix — ignoring")
+            return False
+
+        self._set_known_faces(
+            [entry["id"] for entry in meta],
+            [entry["name"] for entry in meta],
+            matrix,
+        )
 
-            logger.info("Loaded %d encodings from cache", len(self._known_ids))
-            return True
-        return False
+        logger.info("Loaded %d encodings from cache", len(self._known_ids))
+        return True
 
     def open_camera(self, device_index=0, width=640, height=480, warmup=1.0):
         """
@@ -335,7 +920,7 @@ class FaceRecognitionModule:
             device_index: /dev/videoN index.
             width: Capture width.
             height: Capture height.
-            warmup: Seconds to wait for camera auto-adjust.
+            warmup: Upper bound in seconds for camera auto-adjust.
 
         Returns:
             cv2.VideoCapture instance or None.
@@ -353,17 +938,223 @@ class FaceRecognitionModule:
         camera.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
         camera.set(cv2.CAP_PROP_BUFFERSIZE, 1)
 
-        # Warmup — capture and discard a few frames
-        time.sleep(warmup)
-        for _ in range(5):
-            camera.read()
+        waited = self._wait_for_exposure(camera, warmup)
 
-        logger.info("Camera opened (index=%d, %dx%d)", device_index, width, height)
+        logger.info(
+            "Camera opened (index=%d, %dx%d, exposure settled in %.2fs)",
+            device_index, width, height, waited
+        )
         return camera
 
+    @staticmethod
+    def _wait_for_exposure(camera, max_wait, min_brightness=20.0, tolerance=2.0):
+        """
+        Read and discard frames until auto-exposure settles.
+
+        Exposure usually locks within a few hundred ms, so rather than a
+        fixed sleep this stops once the mean brightness of two consecutive
+        frames agrees and is above black.
+
+        Returns:
+            float: Seconds spent waiting.
+        """
+        start = time.monotonic()
+        deadline = start + max_wait
+        previous = None
+        while time.monotonic() < deadline:
+            ret, frame = camera.read()
+            if not ret or frame is None:
+                continue
+            # Every 8th pixel in each direction is plenty for a mean
+            brightness = float(frame[::8, ::8].mean())
+            if (previous is not None and brightness >= min_brightness
+                    and abs(brightness - previous) <= tolerance):
+                break
+            previous = brightness
+        return time.monotonic() - start
+
     @staticmethod
     def close_camera(camera):
         """Release camera resources."""
         if camera is not None:
             camera.release()
             logger.info("Camera released")
+
+
+def _tune_current_thread(cpus=None, nice=0):
+    """
+    Pin the calling thread to `cpus` and lower its nice value.
+
+    Linux applies both per thread, so the grabber and recognizer stay on
+    their own cores instead of migrating (and losing cache) between them.
+    Either step is skipped where unsupported or not permitted.
+    """
+    if cpus and hasattr(os, "sched_setaffinity"):
+        allowed = set(cpus) & os.sched_getaffinity(0)
+        if allowed:
+            try:
+                os.sched_setaffinity(0, allowed)
+            except OSError as e:
+                logger.debug("Could not set CPU affinity %s: %s", sorted(allowed), e)
+    if nice:
+        try:
+            os.nice(nice)
+        except (OSError, AttributeError) as e:
+            # Negative values need CAP_SYS_NICE
+            logger.debug("Could not change nice value by %d: %s", nice, e)
+
+
+class RecognitionWorker:
+    """
+    Run capture and recognition off the main thread.
+
+    A grabber thread keeps only the newest frame (queue of one, oldest
+    dropped) and a recognizer thread runs recognize() on it, so the state
+    machine never blocks on camera.read() or dlib and always sees a result
+    for a fresh frame rather than one that sat in a backlog.
+    """
+
+    def __init__(self, face_module, camera):
+        """
+        Args:
+            face_module: FaceRecognitionModule instance.
+            camera: cv2.VideoCapture instance, owned by the caller.
+        """
+        self.face = face_module
+        self.camera = camera
+        self._frames = queue.Queue(maxsize=1)
+        self._results = queue.Queue(maxsize=1)
+        self._stop_event = threading.Event()
+        self._threads = []
+        self.grabber_cpus = face_module.grabber_cpus
+        self.recognizer_cpus = face_module.recognizer_cpus
+        self.recognizer_nice = face_module.recognizer_nice
+
+    def start(self):
+        """Start the grabber and recognizer threads."""
+        if self._threads:
+            return
+        self._stop_event.clear()
+        self._threads = [
+            threading.Thread(target=self._grab_loop, name="face-grabber", daemon=True),
+            threading.Thread(target=self._recognize_loop, name="face-recognizer", daemon=True),
+        ]
+        for thread in self._threads:
+            thread.start()
+        logger.debug("Recognition worker started")
+
+    def stop(self, timeout=2.0):
+        """Stop both threads; call before releasing the camera."""
+        self._stop_event.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+        logger.debug("Recognition worker stopped")
+
+    def get_result(self, timeout=2.0):
+        """
+        Wait for the next recognition result.
+
+        Args:
+            timeout: Seconds to wait.
+
+        Returns:
+            tuple: (result_dict or None, frame), or (None, None) on timeout.
+        """
+        try:
+            return self._results.get(timeout=timeout)
+        except queue.Empty:
+            return None, None
+
+    @staticmethod
+    def _put_latest(q, item):
+        """Put without blocking, discarding whatever is already queued."""
+        while True:
+            try:
+                q.put_nowait(item)
+                return
+            except queue.Full:
+                try:
+                    q.get_nowait()
+                except queue.Empty:
+                    pass
+
+    def _grab_loop(self):
+        """Read frames as fast as the camera delivers them."""
+        _tune_current_thread(self.grabber_cpus)
+        while not self._stop_event.is_set():
+            frame = self.face.capture_frame(self.camera)
+            if frame is None:
+                self._stop_event.wait(0.05)
+                continue
+            self._put_latest(self._frames, (time.monotonic(), frame))
+
+    def _recognize_loop(self):
+        """Recognize the newest frame and publish the outcome."""
+        _tune_current_thread(self.recognizer_cpus, self.recognizer_nice)
+        while not self._stop_event.is_set():
+            try:
+                _, frame = self._frames.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            try:
+                result = self.face.recognize(frame)
+            except Exception as e:
+                logger.error("Recognition failed: %s", e)
+                continue
+            self._put_latest(self._results, (result, frame))
+
+
+class MotionDetector:
+    """
+    Cheap frame-difference motion check for gating face recognition.
+
+    Frames are shrunk to 160x120 grayscale and compared with a running
+    average background (cv2.accumulateWeighted). Motion is reported when
+    enough pixels differ from the background.
+    """
+
+    SIZE = (160, 120)
+
+    def __init__(self, pixel_delta=25, min_area=0.02, alpha=0.05):
+        """
+        Args:
+            pixel_delta: Grey-level change for a pixel to count as changed.
+            min_area: Fraction of changed pixels that counts as motion.
+            alpha: Background learning rate (higher adapts faster).
+        """
+        self.pixel_delta = pixel_delta
+        self.min_area = min_area
+        self.alpha = alpha
+        self._background = None
+        self._gray = np.empty(self.SIZE[::-1], dtype=np.uint8)
+
+    def reset(self):
+        """Forget the background, e.g. after the camera was reopened."""
+        self._background = None
+
+    def update(self, frame):
+        """
+        Feed a BGR frame and report whether it shows motion.
+
+        Args:
+            frame: BGR numpy array.
+
+        Returns:
+            bool: True if the frame differs enough from the background.
+        """
+        if not OPENCV_AVAILABLE or frame is None:
+            return False
+
+        small = cv2.resize(frame, self.SIZE, interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY, dst=self._gray)
+
+        if self._background is None:
+            self._background = gray.astype(np.float32)
+            return False
+
+        diff = cv2.absdiff(gray, cv2.convertScaleAbs(self._background))
+        cv2.accumulateWeighted(gray, self._background, self.alpha)
+
+        changed = np.count_nonzero(diff > self.pixel_delta) / diff.size
+        return changed >= self.min_area
@@ -6,7 +6,12 @@ fingerprint sensor connected via UART (GPIO14/15 on RPi).
 Templates are stored on-sensor for fast matching & backed up to SQLite.
 """
 
+import queue
+import random
+import struct
 import logging
+import functools
+import threading
 import time
 import serial
 
@@ -39,6 +44,74 @@ LED_MODES = {
     "gradual_off": 0x06,
 }
 
+# AuraLedConfig acknowledgement: header(2) + address(4) + PID(1) + length(2) +
+# confirmation code(1) + checksum(2)
+LED_ACK_LENGTH = 12
+# Upper bound on waiting for that acknowledgement
+LED_ACK_TIMEOUT = 0.05
+
+_ACK = struct.Struct(">HIBHBH")
+_PACKET_HEADER = 0xEF01
+_PID_ACK = 0x07
+
+
+def _build_led_packet(control, color, speed=0x30, count=0x00):
+    """
+    Build a raw aura LED control packet for the R503.
+
+    Packet: Header(2) + Address(4) + PID(1) + Length(2) + InstrCode(1) +
+            Control(1) + Speed(1) + Color(1) + Count(1) + Checksum(2)
+    """
+    packet = bytearray([
+        0xEF, 0x01,                         # Header
+        0xFF, 0xFF, 0xFF, 0xFF,             # Address
+        0x01,                                # PID (command)
+        0x00, 0x07,                          # Length
+        0x35,                                # Instruction code (AuraLedConfig)
+        control,                             # Control mode
+        speed,                               # Speed
+        color,                               # Color
+        count,                               # Count (0 = infinite)
+    ])
+    checksum = sum(packet[6:]) & 0xFFFF
+    packet += checksum.to_bytes(2, "big")
+    return bytes(packet)
+
+
+def _parse_ack(buf):
+    """
+    Decode a 12-byte R503 acknowledgement packet.
+
+    Returns:
+        int or None: The confirmation code (0x00 = OK), or None if the
+        packet is short, malformed or fails its checksum.
+    """
+    if len(buf) < _ACK.size:
+        return None
+    header, _address, pid, length, confirm, checksum = _ACK.unpack_from(buf)
+    if header != _PACKET_HEADER or pid != _PID_ACK:
+        return None
+    if (pid + (length >> 8) + (length & 0xFF) + confirm) & 0xFFFF != checksum:
+        return None
+    return confirm
+
+
+# Every mode/color combination the app uses, built once at import
+_LED_PACKETS = {
+    (control, color, 0x30, 0x00): _build_led_packet(control, color)
+    for control in LED_MODES.values()
+    for color in LED_COLORS.values()
+}
+
+
+def _with_sensor_lock(method):
+    """Run a FingerprintModule method while holding the sensor I/O lock."""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._io_lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
 
 class FingerprintModule:
     """Interface to the R503 fingerprint sensor via UART."""
@@ -58,6 +131,24 @@ class FingerprintModule:
         self.sensor = None
         self._connected = False
 
+        # Occupied template slots as an int bitmap (bit N = position N),
+        # loaded once on connect and kept in step with store/delete.
+        self._slot_bitmap = None
+        self._capacity = 0
+
+        # Every sensor transaction runs under _io_lock so the LED worker's
+        # packets never interleave with a command on the same UART.
+        self._io_lock = threading.RLock()
+        self._led_q = queue.Queue()
+        self._led_gen = 0
+        self._led_thread = None
+        # Last LED state sent, so repeats can skip the UART write
+        self._current_led = None
+        # LED transport, resolved once in connect(): the library's setLED
+        # if it has one, otherwise raw packets on the serial port
+        self._native_led = None
+        self._serial = None
+
     def connect(self):
         """
         Initialize connection to the R503 sensor.
@@ -82,9 +173,14 @@ class FingerprintModule:
                 return False
 
             self.sensor.setSecurityLevel(self.security_level)
+            self._native_led = getattr(self.sensor, "setLED", None)
+            self._serial = self._get_serial()
+            self._enable_low_latency()
 
             template_count = self.sensor.getTemplateCount()
             storage_capacity = self.sensor.getStorageCapacity()
+            self._capacity = storage_capacity
+            self._load_slot_bitmap()
 
             logger.info(
                 "Fingerprint sensor connected: %d/%d templates stored",
@@ -92,6 +188,10 @@ class FingerprintModule:
             )
             self._connected = True
             self._set_led("off", "blue")
+            self._led_thread = threading.Thread(
+                target=self._led_worker, name="fingerprint-led", daemon=True
+            )
+            self._led_thread.start()
             return True
 
         except Exception as e:
@@ -102,14 +202,20 @@ class FingerprintModule:
     def disconnect(self):
         """Close the sensor connection."""
         if self.sensor:
+            if self._led_thread is not None:
+                self._led_q.put(None)
+                self._led_thread.join(timeout=5)
+                self._led_thread = None
             self._set_led("off", "blue")
             self._connected = False
+            self._current_led = None
             logger.info("Fingerprint sensor disconnected")
 
     def is_connected(self):
         """Check if sensor is connected."""
         return self._connected
 
+    @_with_sensor_lock
     def search_fingerprint(self, timeout_seconds=10):
         """
         Wait for a finger and search for a match.
@@ -134,15 +240,12 @@ class FingerprintModule:
             self._set_led("breathing", "blue")
 
             # Wait for finger to be placed
-            start_time = time.time()
             logger.info("Waiting for finger on sensor...")
 
-            while not self.sensor.readImage():
-                if time.time() - start_time > timeout_seconds:
-                    logger.info("Fingerprint scan timeout")
-                    self._set_led("off", "blue")
-                    return None
-                time.sleep(0.1)
+            if not self._wait_for_finger(timeout_seconds):
+                logger.info("Fingerprint scan timeout")
+                self._set_led("off", "blue")
+                return None
 
             # Finger detected — convert to template
             self._set_led("on", "blue")
@@ -156,9 +259,7 @@ class FingerprintModule:
             if finger_id == -1:
                 # No match
                 logger.info("Fingerprint not recognized")
-                self._set_led("flashing", "red")
-                time.sleep(1.5)
-                self._set_led("off", "red")
+                self._flash_led("flashing", "red", 1.5)
                 return None
             else:
                 # Match found
@@ -166,9 +267,7 @@ class FingerprintModule:
                     "Fingerprint matched: ID=%d, confidence=%d",
                     finger_id, confidence
                 )
-                self._set_led("on", "green")
-                time.sleep(1.5)
-                self._set_led("off", "green")
+                self._flash_led("on", "green", 1.5)
                 return {
                     "fingerprint_id": finger_id,
                     "confidence": confidence
@@ -176,11 +275,10 @@ class FingerprintModule:
 
         except Exception as e:
             logger.error("Fingerprint search error: %s", e)
-            self._set_led("flashing", "red")
-            time.sleep(1)
-            self._set_led("off", "red")
+            self._flash_led("flashing", "red", 1)
             return None
 
+    @_with_sensor_lock
     def enroll_fingerprint(self):
         """
         Enroll a new fingerprint (captures 2 samples).
@@ -206,13 +304,10 @@ class FingerprintModule:
 
             # Wait for finger
             timeout = 15
-            start = time.time()
-            while not self.sensor.readImage():
-                if time.time() - start > timeout:
-                    logger.error("Enrollment timeout on first capture")
-                    self._set_led("off", "purple")
-                    return None
-                time.sleep(0.1)
+            if not self._wait_for_finger(timeout):
+                logger.error("Enrollment timeout on first capture")
+                self._set_led("off", "purple")
+                return None
 
             self.sensor.convertImage(0x01)
             self._set_led("on", "purple")
@@ -221,56 +316,47 @@ class FingerprintModule:
             # Wait for finger removal
             time.sleep(1)
             while self.sensor.readImage():
-                time.sleep(0.1)
+                pass
 
             # --- Second capture ---
             self._set_led("breathing", "blue")
             logger.info("Place same finger again for second capture...")
 
-            start = time.time()
-            while not self.sensor.readImage():
-                if time.time() - start > timeout:
-                    logger.error("Enrollment timeout on second capture")
-                    self._set_led("off", "blue")
-                    return None
-                time.sleep(0.1)
+            if not self._wait_for_finger(timeout):
+                logger.error("Enrollment timeout on second capture")
+                self._set_led("off", "blue")
+                return None
 
             self.sensor.convertImage(0x02)
 
             # Create model from 2 captures
             if self.sensor.createTemplate() == 0:
                 logger.error("Fingerprint captures do not match")
-                self._set_led("flashing", "red")
-                time.sleep(1.5)
-                self._set_led("off", "red")
+                self._flash_led("flashing", "red", 1.5)
                 return None
 
             # Find next free position
             position = self._find_free_position()
             if position is None:
                 logger.error("Fingerprint storage full")
-                self._set_led("flashing", "red")
-                time.sleep(1.5)
-                self._set_led("off", "red")
+                self._flash_led("flashing", "red", 1.5)
                 return None
 
             # Store template
             self.sensor.storeTemplate(position, 0x01)
+            self._mark_slot(position, True)
 
             logger.info("Fingerprint enrolled at position %d", position)
-            self._set_led("on", "green")
-            time.sleep(1.5)
-            self._set_led("off", "green")
+            self._flash_led("on", "green", 1.5)
 
             return position
 
         except Exception as e:
             logger.error("Fingerprint enrollment error: %s", e)
-            self._set_led("flashing", "red")
-            time.sleep(1)
-            self._set_led("off", "red")
+            self._flash_led("flashing", "red", 1)
             return None
 
+    @_with_sensor_lock
     def delete_fingerprint(self, position):
         """
         Delete a fingerprint template from the sensor.
@@ -286,6 +372,7 @@ class FingerprintModule:
 
         try:
             if self.sensor.deleteTemplate(position):
+                self._mark_slot(position, False)
                 logger.info("Fingerprint template %d deleted", position)
                 return True
             return False
@@ -293,6 +380,7 @@ class FingerprintModule:
             logger.error("Failed to delete fingerprint %d: %s", position, e)
             return False
 
+    @_with_sensor_lock
     def download_template(self, position):
         """
         Download a template from the sensor for backup.
@@ -315,6 +403,7 @@ class FingerprintModule:
             logger.error("Failed to download template %d: %s", position, e)
             return None
 
+    @_with_sensor_lock
     def upload_template(self, position, characteristics):
         """
         Upload a template to the sensor (restore from backup).
@@ -332,12 +421,14 @@ class FingerprintModule:
         try:
             self.sensor.uploadCharacteristics(0x01, characteristics)
             self.sensor.storeTemplate(position, 0x01)
+            self._mark_slot(position, True)
             logger.info("Template uploaded to position %d", position)
             return True
         except Exception as e:
             logger.error("Failed to upload template to %d: %s", position, e)
             return False
 
+    @_with_sensor_lock
     def get_template_count(self):
         """Get number of stored templates on sensor."""
         if not self._connected:
@@ -347,28 +438,114 @@ class FingerprintModule:
         except Exception:
             return 0
 
-    def _find_free_position(self):
-        """Find the next available template position on sensor."""
+    def _wait_for_finger(self, timeout_seconds):
+        """
+        Poll the sensor until a finger image is captured or time runs out.
+
+        The R503 only talks in request/response, so there is nothing to
+        select() on until we ask. Each readImage() is already a blocking
+        UART round trip, which paces the loop without an extra sleep.
+
+        Returns:
+            bool: True if an image was captured into the sensor buffer.
+        """
+        deadline = time.monotonic() + timeout_seconds
+        while not self.sensor.readImage():
+            if time.monotonic() >= deadline:
+                return False
+        return True
+
+    def _get_serial(self):
+        """Return the sensor's underlying serial.Serial, if reachable."""
+        if self.sensor is None:
+            return None
+        for attr in ("_serial", "_PyFingerprint__serial"):
+            ser = getattr(self.sensor, attr, None)
+            if ser is not None:
+                return ser
+        return None
+
+    def _enable_low_latency(self):
+        """Ask the tty driver for ASYNC_LOW_LATENCY (best effort, Linux only)."""
+        ser = self._serial
+        if ser is None or not hasattr(ser, "set_low_latency_mode"):
+            return
         try:
-            # Get table of used positions
-            table = self.sensor.getTemplateIndex(0)
-            for i in range(len(table)):
-                if table[i] is False:
-                    return i
-            # Check additional pages if needed
-            for page in range(1, 4):
-                try:
-                    table = self.sensor.getTemplateIndex(page)
-                    page_offset = page * len(table)
-                    for i in range(len(table)):
-                        if table[i] is False:
-                            return page_offset + i
-                except Exception:
+            ser.set_low_latency_mode(True)
+            logger.debug("Low-latency mode enabled on %s", self.port)
+        except (OSError, ValueError, NotImplementedError) as e:
+            logger.debug("Low-latency mode not available on %s: %s", self.port, e)
+
+    def _load_slot_bitmap(self):
+        """Read the sensor's template index pages into the local bitmap."""
+        try:
+            bitmap = 0
+            offset = 0
+            for page in range(4):
+                if offset >= self._capacity:
                     break
-            return None
+                table = self.sensor.getTemplateIndex(page)
+                for i, used in enumerate(table):
+                    if used:
+                        bitmap |= 1 << (offset + i)
+                offset += len(table)
+            self._slot_bitmap = bitmap
         except Exception as e:
-            logger.error("Error finding free position: %s", e)
+            logger.warning("Could not read template index: %s", e)
+            self._slot_bitmap = None
+
+    def _mark_slot(self, position, used):
+        """Record a store (used=True) or delete in the slot bitmap."""
+        if self._slot_bitmap is None:
+            return
+        if used:
+            self._slot_bitmap |= 1 << position
+        else:
+            self._slot_bitmap &= ~(1 << position)
+
+    def _find_free_position(self):
+        """Find the lowest free template position, or None if full."""
+        if self._slot_bitmap is None:
+            self._load_slot_bitmap()
+            if self._slot_bitmap is None:
+                return None
+
+        free = ~self._slot_bitmap & ((1 << self._capacity) - 1)
+        if not free:
             return None
+        # Isolate the lowest set bit
+        return (free & -free).bit_length() - 1
+
+    def _flash_led(self, mode, color, duration):
+        """
+        Show an LED state for `duration` seconds without blocking the caller.
+
+        The LED is set now; the LED worker turns it off later unless another
+        LED change has happened in the meantime.
+        """
+        with self._io_lock:
+            self._set_led(mode, color)
+            generation = self._led_gen
+        if self._led_thread is None:
+            # No worker (e.g. not fully connected) — fall back to blocking
+            time.sleep(duration)
+            self._set_led("off", color)
+            return
+        self._led_q.put((generation, color, time.monotonic() + duration))
+
+    def _led_worker(self):
+        """Background thread: apply delayed LED 'off' commands."""
+        while True:
+            item = self._led_q.get()
+            if item is None:
+                return
+            generation, color, deadline = item
+            delay = deadline - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            with self._io_lock:
+                if generation == self._led_gen:
+                    self._set_led("off", color)
 
     def _set_led(self, mode, color):
         """
@@ -381,6 +558,15 @@ class FingerprintModule:
         if not self._connected or self.sensor is None:
             return
 
+        # Bump the generation even for a repeat, so a pending delayed 'off'
+        # from an earlier identical state doesn't cut this one short
+        self._led_gen += 1
+        # Any colour looks the same when the LED is off
+        state = (mode, None if mode == "off" else color)
+        if state == self._current_led:
+            return
+        self._current_led = state
+
         mode_code = LED_MODES.get(mode, 0x04)
         color_code = LED_COLORS.get(color, 0x02)
 
@@ -388,8 +574,8 @@ class FingerprintModule:
             # R503 LED control via packet
             # Some pyfingerprint versions support this directly;
             # otherwise we send a raw command
-            if hasattr(self.sensor, 'setLED'):
-                self.sensor.setLED(mode_code, color_code, 0x00, 0x00)
+            if self._native_led is not None:
+                self._native_led(mode_code, color_code, 0x00, 0x00)
             else:
                 # Construct the aura LED control packet manually
                 self._send_led_command(mode_code, color_code)
@@ -397,35 +583,31 @@ class FingerprintModule:
             logger.debug("LED control not supported or error: %s", e)
 
     def _send_led_command(self, control, color, speed=0x30, count=0x00):
-        """
-        Send raw aura LED control command to R503.
-
-        Packet: Header(2) + Address(4) + PID(1) + Length(2) + InstrCode(1) +
-                Control(1) + Speed(1) + Color(1) + Count(1) + Checksum(2)
-        """
+        """Send a raw aura LED control command to the R503."""
         try:
             # Use the underlying serial port if accessible
-            if hasattr(self.sensor, '_serial'):
-                packet = bytearray([
-                    0xEF, 0x01,                         # Header
-                    0xFF, 0xFF, 0xFF, 0xFF,             # Address
-                    0x01,                                # PID (command)
-                    0x00, 0x07,                          # Length
-                    0x35,                                # Instruction code (AuraLedConfig)
-                    control,                             # Control mode
-                    speed,                               # Speed
-                    color,                               # Color
-                    count,                               # Count (0 = infinite)
-                ])
-                # Calculate checksum
-                checksum = sum(packet[6:]) & 0xFFFF
-                packet.append((checksum >> 8) & 0xFF)
-                packet.append(checksum & 0xFF)
-
-                self.sensor._serial.write(packet)
-                time.sleep(0.1)
-                # Read and discard response
-                self.sensor._serial.read(self.sensor._serial.in_waiting)
+            ser = self._serial
+            if ser is not None:
+                key = (control, color, speed, count)
+                packet = _LED_PACKETS.get(key)
+                if packet is None:
+                    packet = _build_led_packet(*key)
+                ser.write(packet)
+                # Consume the acknowledgement so it can't be mistaken for the
+                # reply to the next pyfingerprint command. read() returns as
+                # soon as the bytes arrive; the short timeout only applies to
+                # this read, since pyfingerprint needs its own longer one.
+                saved_timeout = ser.timeout
+                ser.timeout = LED_ACK_TIMEOUT
+                try:
+                    ack = ser.read(LED_ACK_LENGTH)
+                finally:
+                    ser.timeout = saved_timeout
+                confirm = _parse_ack(ack)
+                if confirm is None:
+                    logger.debug("No valid LED acknowledgement (%d bytes)", len(ack))
+                elif confirm != 0x00:
+                    logger.debug("Sensor rejected LED command: code 0x%02X", confirm)
         except Exception as e:
             logger.debug("Raw LED command failed: %s", e)
 
@@ -434,9 +616,17 @@ class SimulatedFingerprintModule:
     """Simulated fingerprint sensor for development without hardware."""
 
     def __init__(self, config):
+        """
+        Args:
+            config: dict from settings.yaml 'fingerprint' section. Uses
+                sim_match_prob (chance a scan matches an enrolled ID) and
+                sim_latency_ms (delay mimicking sensor capture + search).
+        """
         self._connected = False
         self._templates = {}
         self._next_id = 0
+        self.match_prob = config.get("sim_match_prob", 0.8)
+        self.latency = config.get("sim_latency_ms", 400) / 1000.0
         logger.info("Using SIMULATED fingerprint sensor")
 
     def connect(self):
@@ -451,6 +641,11 @@ class SimulatedFingerprintModule:
         return self._connected
 
     def search_fingerprint(self, timeout_seconds=10):
+        time.sleep(self.latency)
+        if self._templates and random.random() < self.match_prob:
+            fid = random.choice(list(self._templates))
+            logger.info("[SIM] Fingerprint search — matched ID=%d", fid)
+            return {"fingerprint_id": fid, "confidence": 100}
         logger.info("[SIM] Fingerprint search — returning no match")
         return None
 
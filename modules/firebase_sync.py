@@ -9,14 +9,21 @@ Uses exponential backoff on connection failures.
 import os
 import time
 import json
-import pickle
 import logging
 import threading
 import socket
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
+
+from modules.database import ENCODING_DIM
 
 logger = logging.getLogger(__name__)
 
+# Records per multi-location update() request
+SYNC_BATCH_SIZE = 200
+# Concurrent Firebase Storage uploads per sync batch
+IMAGE_UPLOAD_WORKERS = 4
+
 try:
     import firebase_admin
     from firebase_admin import credentials, db as firebase_db, storage
@@ -42,15 +49,23 @@ class FirebaseSync:
         self.sync_interval = config.get("sync_interval", 60)
         self.max_retry_delay = config.get("max_retry_delay", 300)
         self.upload_images = config.get("upload_images", True)
+        self.image_url_expiry_days = config.get("image_url_expiry_days", 365)
 
         self.database = database
         self._firebase_app = None
+        self._bucket = None
+        self._upload_pool = None
         self._initialized = False
         self._running = False
+        self._stop_event = threading.Event()
         self._thread = None
         self._retry_delay = 5  # Initial retry delay in seconds
         self._last_sync_time = None
         self._sync_stats = {"users": 0, "logs": 0, "images": 0, "errors": 0}
+        self._stats_lock = threading.Lock()
+        self._device_id = socket.gethostname()
+        # Monotonic time of the last successful Firebase request or probe
+        self._last_net_ok_ts = None
 
     def initialize(self):
         """
@@ -86,6 +101,8 @@ class FirebaseSync:
                 init_kwargs["storageBucket"] = self.storage_bucket
 
             self._firebase_app = firebase_admin.initialize_app(cred, init_kwargs)
+            if self.storage_bucket:
+                self._bucket = self._open_bucket()
             self._initialized = True
             logger.info("Firebase initialized successfully")
             return True
@@ -102,6 +119,7 @@ class FirebaseSync:
                 return
 
         self._running = True
+        self._stop_event.clear()
         self._thread = threading.Thread(target=self._sync_loop, daemon=True)
         self._thread.start()
         logger.info("Firebase sync thread started (interval=%ds)", self.sync_interval)
@@ -109,8 +127,12 @@ class FirebaseSync:
     def stop(self):
         """Stop the background sync thread."""
         self._running = False
+        self._stop_event.set()
         if self._thread and self._thread.is_alive():
             self._thread.join(timeout=10)
+        if self._upload_pool is not None:
+            self._upload_pool.shutdown(wait=False)
+            self._upload_pool = None
         logger.info("Firebase sync thread stopped")
 
     def is_running(self):
@@ -135,7 +157,7 @@ class FirebaseSync:
 
         while self._running:
             try:
-                if self._check_internet():
+                if self._is_online():
                     self._perform_sync()
                     self._retry_delay = 5  # Reset on success
                 else:
@@ -146,31 +168,33 @@ class FirebaseSync:
                     )
             except Exception as e:
                 logger.error("Sync error: %s", e)
-                self._sync_stats["errors"] += 1
+                self._count("errors", 1)
                 self._retry_delay = min(
                     self._retry_delay * 2,
                     self.max_retry_delay
                 )
 
-            # Wait for next sync interval
+            # Wait for next sync interval; stop() wakes us immediately
             wait_time = max(self.sync_interval, self._retry_delay)
-            for _ in range(int(wait_time)):
-                if not self._running:
-                    return
-                time.sleep(1)
+            if self._stop_event.wait(wait_time):
+                return
 
     def _perform_sync(self):
         """Execute all pending sync operations."""
         logger.debug("Starting sync cycle...")
 
-        # Sync users
-        self._sync_users()
-
-        # Sync access logs
-        self._sync_access_logs()
-
-        # Pull remote updates (new users from admin panel)
-        self._pull_remote_users()
+        # Users, access logs and remote enrollments are independent and
+        # network-bound, so run them side by side rather than back to back.
+        # Remotely enrolled users are pushed back up on the next cycle.
+        with ThreadPoolExecutor(max_workers=3) as stages:
+            futures = [
+                stages.submit(self._sync_users),
+                stages.submit(self._sync_access_logs),
+                stages.submit(self._pull_remote_users),
+            ]
+        # Re-raise the first failure so the loop backs off as before
+        for future in futures:
+            future.result()
 
         self._last_sync_time = datetime.now().isoformat()
         logger.debug("Sync cycle complete")
@@ -189,8 +213,10 @@ class FirebaseSync:
         logger.info("Syncing %d users to Firebase", len(unsynced))
         ref = firebase_db.reference("users")
 
-        for user in unsynced:
-            try:
+        for start in range(0, len(unsynced), SYNC_BATCH_SIZE):
+            batch = unsynced[start:start + SYNC_BATCH_SIZE]
+            updates = {}
+            for user in batch:
                 user_data = {
                     "name": user["name"],
                     "fingerprint_id": user.get("fingerprint_id", -1),
@@ -202,20 +228,28 @@ class FirebaseSync:
 
                 # Upload face encoding as base64 if available
                 if user.get("face_encoding") is not None:
-                    import base64
-                    encoded = base64.b64encode(
-                        pickle.dumps(user["face_encoding"])
-                    ).decode("utf-8")
-                    user_data["face_encoding_b64"] = encoded
+                    # Raw little-endian float32, not pickle: portable and
+                    # safe to decode outside Python. Encoded once by the
+                    # database when the face is stored.
+                    user_data["face_encoding_b64"] = user["face_encoding_b64"]
+                    user_data["face_encoding_shape"] = [ENCODING_DIM]
+                    user_data["face_encoding_dtype"] = "float32"
 
-                ref.child(str(user["id"])).set(user_data)
-                self.database.mark_synced("users", user["id"])
-                self._sync_stats["users"] += 1
-                logger.debug("Synced user %d: %s", user["id"], user["name"])
+                updates[str(user["id"])] = user_data
 
+            # One multi-location update per batch: a single request that
+            # the server applies atomically
+            try:
+                ref.update(updates)
+                self._mark_online()
             except Exception as e:
-                logger.error("Failed to sync user %d: %s", user["id"], e)
-                self._sync_stats["errors"] += 1
+                logger.error("Failed to sync %d users: %s", len(batch), e)
+                self._count("errors", 1)
+                return
+
+            self.database.mark_synced_many("users", [u["id"] for u in batch])
+            self._count("users", len(batch))
+            logger.debug("Synced %d users", len(batch))
 
     # -------------------------------------------------------------------------
     # Sync Access Logs
@@ -230,9 +264,15 @@ class FirebaseSync:
 
         logger.info("Syncing %d access logs to Firebase", len(unsynced))
         ref = firebase_db.reference("access_logs")
+        # {directory: set of file names}, listed once per cycle
+        listings = {}
 
-        for log_entry in unsynced:
-            try:
+        for start in range(0, len(unsynced), SYNC_BATCH_SIZE):
+            batch = unsynced[start:start + SYNC_BATCH_SIZE]
+            image_urls = self._upload_batch_images(batch, listings)
+
+            updates = {}
+            for log_entry in batch:
                 log_data = {
                     "user_id": log_entry.get("user_id"),
                     "user_name": log_entry.get("user_name", "Unknown"),
@@ -241,46 +281,138 @@ class FirebaseSync:
                     "status": log_entry["status"],
                     "timestamp": log_entry["timestamp"],
                     "confidence": log_entry.get("confidence", 0.0),
-                    "device_id": socket.gethostname(),
+                    "device_id": self._device_id,
                 }
+                image_url = image_urls.get(log_entry["id"])
+                if image_url:
+                    log_data["image_url"] = image_url
+                updates[str(log_entry["id"])] = log_data
 
-                # Upload image to Firebase Storage if available
-                image_path = log_entry.get("image_path")
-                if image_path and self.upload_images and os.path.exists(image_path):
-                    image_url = self._upload_image(image_path, log_entry["id"])
-                    if image_url:
-                        log_data["image_url"] = image_url
-                        self._sync_stats["images"] += 1
+            try:
+                ref.update(updates)
+                self._mark_online()
+            except Exception as e:
+                logger.error("Failed to sync %d access logs: %s", len(batch), e)
+                self._count("errors", 1)
+                return
 
-                ref.child(str(log_entry["id"])).set(log_data)
-                self.database.mark_synced("access_logs", log_entry["id"])
-                self._sync_stats["logs"] += 1
+            self.database.mark_synced_many("access_logs", [l["id"] for l in batch])
+            self._count("logs", len(batch))
 
-            except Exception as e:
-                logger.error("Failed to sync log %d: %s", log_entry["id"], e)
-                self._sync_stats["errors"] += 1
+    def _upload_batch_images(self, logs, listings):
+        """
+        Upload the captured images for a batch of logs concurrently.
+
+        Args:
+            logs: access log dicts in the batch.
+            listings: per-cycle cache of directory listings, filled lazily.
+
+        Returns:
+            dict: {log_id: signed_url} (v2 signed GET URL) for every successful upload.
+        """
+        if not self.upload_images:
+            return {}
+
+        pending = [
+            (log_entry["id"], log_entry["image_path"]) for log_entry in logs
+            if log_entry.get("image_path")
+            and self._image_exists(log_entry["image_path"], listings)
+        ]
+        if not pending:
+            return {}
+
+        # Uploads are socket-bound, so threads overlap their round trips;
+        # the pool size caps how many share the uplink at once
+        if self._upload_pool is None:
+            self._upload_pool = ThreadPoolExecutor(
+                max_workers=IMAGE_UPLOAD_WORKERS, thread_name_prefix="image-upload"
+            )
+        futures = {
+            self._upload_pool.submit(self._upload_image, image_path, log_id): log_id
+            for log_id, image_path in pending
+        }
+        results = {}
+        for future in as_completed(futures):
+            url = future.result()
+            if url:
+                results[futures[future]] = url
+
+        self._count("images", len(results))
+        return results
+
+    @staticmethod
+    def _image_exists(image_path, listings):
+        """
+        Check for an image using one scandir() per directory per cycle.
+
+        A backlog usually holds many snapshots from the same few per-user
+        directories, so listing each once is far cheaper than a stat per row.
+        """
+        directory, name = os.path.split(image_path)
+        names = listings.get(directory)
+        if names is None:
+            try:
+                with os.scandir(directory or ".") as entries:
+                    names = {entry.name for entry in entries}
+            except OSError:
+                names = set()
+            listings[directory] = names
+        return name in names
 
     def _upload_image(self, image_path, log_id):
         """
         Upload a face image to Firebase Storage.
 
+        The returned link is a signed URL computed locally from the service
+        account key, so the object stays private and no ACL request is made.
+
         Returns:
-            str: Public URL of the uploaded image, or None.
+            str: Signed URL of the uploaded image, or None.
         """
-        if not self.storage_bucket:
+        if self._bucket is None:
             return None
 
         try:
-            bucket = storage.bucket()
+            bucket = self._bucket
             blob_name = f"access_images/{log_id}_{os.path.basename(image_path)}"
             blob = bucket.blob(blob_name)
-            blob.upload_from_filename(image_path)
-            blob.make_public()
-            return blob.public_url
+            # Door snapshots are small JPEGs: send them in one multipart
+            # request with an explicit type rather than via a resumable
+            # session
+            with open(image_path, "rb") as f:
+                data = f.read()
+            blob.chunk_size = None
+            blob.upload_from_string(data, content_type="image/jpeg")
+            # V2 signing: V4 URLs are capped at 7 days, too short for a log
+            return blob.generate_signed_url(
+                version="v2",
+                expiration=timedelta(days=self.image_url_expiry_days),
+                method="GET",
+            )
         except Exception as e:
             logger.error("Image upload failed: %s", e)
             return None
 
+    def _open_bucket(self):
+        """
+        Get the Storage bucket once and size its keep-alive connection pool.
+
+        The bucket's client holds a single authorized requests session; give
+        its HTTPS adapter enough pooled connections for the concurrent upload
+        workers so each keeps its TLS session between images.
+        """
+        bucket = storage.bucket()
+        try:
+            from requests.adapters import HTTPAdapter
+            session = bucket.client._http
+            adapter = HTTPAdapter(
+                pool_connections=1, pool_maxsize=IMAGE_UPLOAD_WORKERS * 2
+            )
+            session.mount("https://", adapter)
+        except Exception as e:
+            logger.debug("Could not resize Storage connection pool: %s", e)
+        return bucket
+
     # -------------------------------------------------------------------------
     # Pull Remote Users
     # -------------------------------------------------------------------------
@@ -293,6 +425,7 @@ class FirebaseSync:
         try:
             ref = firebase_db.reference("remote_enrollments")
             remote_data = ref.get()
+            self._mark_online()
 
             if not remote_data:
                 return
@@ -329,7 +462,7 @@ class FirebaseSync:
             logger.warning("Firebase not initialized")
             return False
 
-        if not self._check_internet():
+        if not self._is_online():
             logger.warning("No internet connection")
             return False
 
@@ -344,8 +477,34 @@ class FirebaseSync:
     # Utilities
     # -------------------------------------------------------------------------
 
+    def _count(self, key, amount):
+        """Add to a sync counter (stages update them from several threads)."""
+        with self._stats_lock:
+            self._sync_stats[key] += amount
+
+    def _mark_online(self):
+        """Record that the network just worked."""
+        self._last_net_ok_ts = time.monotonic()
+
+    def _is_online(self):
+        """
+        Decide whether a sync attempt is worthwhile.
+
+        A Firebase request that succeeded during the previous cycle (within
+        two sync intervals, since each cycle sleeps one full interval after
+        its last request) is taken as proof of connectivity; only otherwise
+        is a probe sent.
+        """
+        if (self._last_net_ok_ts is not None
+                and time.monotonic() - self._last_net_ok_ts < 2 * self.sync_interval):
+            return True
+        if self._check_internet():
+            self._mark_online()
+            return True
+        return False
+
     @staticmethod
-    def _check_internet(host="8.8.8.8", port=53, timeout=3):
+    def _check_internet(host="8.8.8.8", port=53, timeout=1):
         """
         Check internet connectivity by attempting a socket connection.
 
@@ -358,10 +517,9 @@ class FirebaseSync:
             bool: True if internet is available.
         """
         try:
-            socket.setdefaulttimeout(timeout)
-            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            sock.connect((host, port))
-            sock.close()
-            return True
+            # Per-socket timeout bounds the probe without touching the
+            # process-wide default used by the Firebase HTTP client
+            with socket.create_connection((host, port), timeout=timeout):
+                return True
         except (socket.error, OSError):
             return False
@@ -4,12 +4,58 @@ GPIO Controller — Manage relay, buzzer, PIR sensor, buttons, and flash LED.
 Supports both real RPi.GPIO and a simulated mode for development.
 """
 
+import os
+import mmap
 import logging
+import queue
 import time
 import threading
+from datetime import timedelta
 
 logger = logging.getLogger(__name__)
 
+# BCM283x/BCM2711 GPIO block, as exposed by /dev/gpiomem: output set,
+# output clear and pin level registers for pins 0-31 (32-bit word offsets)
+GPSET0_WORD = 0x1C // 4
+GPCLR0_WORD = 0x28 // 4
+GPLEV0_WORD = 0x34 // 4
+# SoCs with that register layout (the Pi 5's RP1 is different)
+GPIOMEM_SOCS = (b"brcm,bcm2835", b"brcm,bcm2836", b"brcm,bcm2837", b"brcm,bcm2711")
+
+# Buzzer patterns as (on_seconds, off_seconds) beeps; "long" is built from
+# the requested duration
+BUZZER_PATTERNS = {
+    "short": ((0.2, 0),),
+    "success": ((0.1, 0.1), (0.1, 0)),
+    "alert": ((0.3, 0.2), (0.3, 0.2), (0.3, 0)),
+    "denied": ((0.5, 0.2), (0.5, 0)),
+    "sos": (
+        (0.1, 0.1), (0.1, 0.1), (0.1, 0.3),  # S
+        (0.3, 0.1), (0.3, 0.1), (0.3, 0.3),  # O
+        (0.1, 0.1), (0.1, 0.1), (0.1, 0),    # S
+    ),
+}
+
+
+def _buzzer_schedule(beeps):
+    """
+    Flatten (on, off) beeps into (offset_seconds, level) toggles.
+
+    Offsets are measured from the start of the pattern, so playback can
+    sleep until each deadline instead of accumulating sleep error.
+    """
+    schedule = []
+    t = 0.0
+    for on_time, off_time in beeps:
+        schedule.append((t, True))
+        t += on_time
+        schedule.append((t, False))
+        t += off_time
+    return tuple(schedule)
+
+
+BUZZER_SCHEDULES = {name: _buzzer_schedule(beeps) for name, beeps in BUZZER_PATTERNS.items()}
+
 try:
     import RPi.GPIO as GPIO
     GPIO_AVAILABLE = True
@@ -17,6 +63,13 @@ except ImportError:
     GPIO_AVAILABLE = False
     logger.warning("RPi.GPIO not available. Using simulation mode.")
 
+try:
+    import gpiod
+    from gpiod.line import Bias, Edge
+    GPIOD_AVAILABLE = True
+except ImportError:
+    GPIOD_AVAILABLE = False
+
 
 class GPIOController:
     """Control all GPIO-connected hardware: relay, buzzer, PIR, buttons, flash."""
@@ -42,15 +95,44 @@ class GPIOController:
         self.buzzer_duration = config.get("buzzer_alert_duration", 3)
         self.debounce_time = config.get("debounce_time", 300)
 
+        # Write output pins straight to the GPIO registers when possible
+        self.fast_outputs = config.get("fast_outputs", True)
+        self._gpiomem = None
+        self._gpio_regs = None
+
+        # Button edges via libgpiod v2 (kernel debounce + timestamps, one
+        # thread for all buttons) when installed; "rpi" forces RPi.GPIO
+        self.button_backend = config.get("button_backend", "auto")
+        self.gpiochip = config.get("gpiochip", "/dev/gpiochip0")
+        self._button_request = None
+        self._button_thread = None
+
         # State
         self._relay_active = False
         self._flash_on = False
-        self._relay_timer = None
+        self._closing = False
 
         if not self.simulate:
             self._setup_gpio()
         else:
             logger.info("[SIM] GPIO controller in simulation mode")
+        self._bind_outputs()
+
+        # One long-lived thread each for relay timeouts and buzzer patterns,
+        # instead of a new Timer/Thread per access
+        self._relay_lock = threading.Lock()
+        self._relay_deadline = 0.0
+        self._relay_wakeup = threading.Event()
+        self._relay_thread = threading.Thread(
+            target=self._relay_loop, name="relay-timer", daemon=True
+        )
+        self._relay_thread.start()
+
+        self._buzzer_q = queue.Queue()
+        self._buzzer_thread = threading.Thread(
+            target=self._buzzer_loop, name="buzzer", daemon=True
+        )
+        self._buzzer_thread.start()
 
     def _setup_gpio(self):
         """Initialize GPIO pins."""
@@ -67,12 +149,87 @@ class GPIOController:
         GPIO.setup(self.PIN_OUTSIDE_BTN, GPIO.IN, pull_up_down=GPIO.PUD_UP)
         GPIO.setup(self.PIN_INSIDE_BTN, GPIO.IN, pull_up_down=GPIO.PUD_UP)
 
+        if self.fast_outputs:
+            self._map_gpiomem()
+
         logger.info(
             "GPIO initialized — PIR:%d, Relay:%d, Buzzer:%d, OutBtn:%d, InBtn:%d, Flash:%d",
             self.PIN_PIR, self.PIN_RELAY, self.PIN_BUZZER,
             self.PIN_OUTSIDE_BTN, self.PIN_INSIDE_BTN, self.PIN_FLASH
         )
 
+    def _map_gpiomem(self):
+        """
+        Map /dev/gpiomem so pins can be set or read with one register access.
+
+        RPi.GPIO still owns pin modes, pulls and edge detection; only
+        output writes and level reads skip it. Falls back to GPIO.output on anything but a
+        known BCM283x/BCM2711 board.
+        """
+        try:
+            with open("/proc/device-tree/compatible", "rb") as f:
+                compatible = f.read()
+            if not any(soc in compatible for soc in GPIOMEM_SOCS):
+                logger.info("GPIO register layout unknown for this board — using RPi.GPIO output")
+                return
+            fd = os.open("/dev/gpiomem", os.O_RDWR | os.O_SYNC)
+            try:
+                self._gpiomem = mmap.mmap(fd, 4096)
+            finally:
+                os.close(fd)
+        except OSError as e:
+            logger.info("Direct GPIO access unavailable (%s) — using RPi.GPIO output", e)
+            return
+        # A 32-bit view makes each write a single word store to the register
+        self._gpio_regs = memoryview(self._gpiomem).cast("I")
+        logger.info("GPIO outputs via /dev/gpiomem")
+
+    def _write_pin(self, pin, high):
+        """Drive an output pin high or low."""
+        if self._gpio_regs is not None:
+            self._gpio_regs[GPSET0_WORD if high else GPCLR0_WORD] = 1 << pin
+        else:
+            GPIO.output(pin, GPIO.HIGH if high else GPIO.LOW)
+
+    def _bind_outputs(self):
+        """
+        Resolve each output to a real or simulated setter once.
+
+        Callers then make one call per toggle instead of re-checking
+        self.simulate every time.
+        """
+        if self.simulate:
+            def set_relay(high):
+                logger.info("[SIM] RELAY %s", "ON — Door unlocked" if high else "OFF — Door locked")
+
+            def set_flash(high):
+                logger.info("[SIM] FLASH LED %s", "ON" if high else "OFF")
+
+            def set_buzzer(high):
+                pass
+        else:
+            write = self._write_pin
+            relay, flash, buzzer = self.PIN_RELAY, self.PIN_FLASH, self.PIN_BUZZER
+
+            def set_relay(high):
+                write(relay, high)
+
+            def set_flash(high):
+                write(flash, high)
+
+            def set_buzzer(high):
+                write(buzzer, high)
+
+        self._set_relay = set_relay
+        self._set_flash = set_flash
+        self._set_buzzer = set_buzzer
+
+    def _read_pin(self, pin):
+        """Return True if an input pin is at a high level."""
+        if self._gpio_regs is not None:
+            return bool(self._gpio_regs[GPLEV0_WORD] & (1 << pin))
+        return GPIO.input(pin) == GPIO.HIGH
+
     # -------------------------------------------------------------------------
     # Relay (Door Lock)
     # -------------------------------------------------------------------------
@@ -87,29 +244,33 @@ class GPIOController:
         if duration is None:
             duration = self.relay_duration
 
-        if self._relay_active:
-            logger.debug("Relay already active, extending duration")
-            if self._relay_timer:
-                self._relay_timer.cancel()
-        else:
-            if self.simulate:
-                logger.info("[SIM] RELAY ON — Door unlocked")
+        with self._relay_lock:
+            if self._relay_active:
+                logger.debug("Relay already active, extending duration")
             else:
-                GPIO.output(self.PIN_RELAY, GPIO.HIGH)
-            self._relay_active = True
-            logger.info("Relay activated for %d seconds", duration)
-
-        # Auto-deactivate after duration
-        self._relay_timer = threading.Timer(duration, self.deactivate_relay)
-        self._relay_timer.daemon = True
-        self._relay_timer.start()
+                self._set_relay(True)
+                self._relay_active = True
+                logger.info("Relay activated for %d seconds", duration)
+
+            # Auto-deactivate after duration (handled by _relay_loop)
+            self._relay_deadline = time.monotonic() + duration
+        self._relay_wakeup.set()
+
+    def _relay_loop(self):
+        """Deactivate the relay when its deadline passes."""
+        while not self._closing:
+            self._relay_wakeup.clear()
+            with self._relay_lock:
+                if self._relay_active and time.monotonic() >= self._relay_deadline:
+                    self.deactivate_relay()
+                timeout = None
+                if self._relay_active:
+                    timeout = max(0.0, self._relay_deadline - time.monotonic())
+            self._relay_wakeup.wait(timeout)
 
     def deactivate_relay(self):
         """Deactivate relay (lock door)."""
-        if self.simulate:
-            logger.info("[SIM] RELAY OFF — Door locked")
-        else:
-            GPIO.output(self.PIN_RELAY, GPIO.LOW)
+        self._set_relay(False)
         self._relay_active = False
         logger.info("Relay deactivated — door locked")
 
@@ -133,48 +294,34 @@ class GPIOController:
         if duration is None:
             duration = self.buzzer_duration
 
-        thread = threading.Thread(
-            target=self._buzzer_pattern,
-            args=(pattern, duration),
-            daemon=True
-        )
-        thread.start()
+        self._buzzer_q.put((pattern, duration))
+
+    def _buzzer_loop(self):
+        """Play queued buzzer patterns one after another."""
+        while True:
+            item = self._buzzer_q.get()
+            if item is None:
+                return
+            self._buzzer_pattern(*item)
 
     def _buzzer_pattern(self, pattern, duration):
-        """Execute buzzer pattern in a separate thread."""
-        patterns = {
-            "short": [(0.2, 0)],
-            "success": [(0.1, 0.1), (0.1, 0)],
-            "alert": [(0.3, 0.2), (0.3, 0.2), (0.3, 0)],
-            "denied": [(0.5, 0.2), (0.5, 0)],
-            "long": [(duration, 0)],
-            "sos": [
-                (0.1, 0.1), (0.1, 0.1), (0.1, 0.3),  # S
-                (0.3, 0.1), (0.3, 0.1), (0.3, 0.3),  # O
-                (0.1, 0.1), (0.1, 0.1), (0.1, 0),     # S
-            ],
-        }
-
-        beeps = patterns.get(pattern, patterns["alert"])
-
-        for on_time, off_time in beeps:
-            self._buzzer_on()
-            time.sleep(on_time)
-            self._buzzer_off()
-            if off_time > 0:
-                time.sleep(off_time)
-
-    def _buzzer_on(self):
-        if self.simulate:
-            logger.debug("[SIM] BUZZER ON")
+        """Execute a buzzer pattern (runs on the buzzer thread)."""
+        if pattern == "long":
+            schedule = _buzzer_schedule(((duration, 0),))
         else:
-            GPIO.output(self.PIN_BUZZER, GPIO.HIGH)
+            schedule = BUZZER_SCHEDULES.get(pattern, BUZZER_SCHEDULES["alert"])
 
-    def _buzzer_off(self):
+        # One log line per pattern, not one per toggle
         if self.simulate:
-            logger.debug("[SIM] BUZZER OFF")
-        else:
-            GPIO.output(self.PIN_BUZZER, GPIO.LOW)
+            logger.debug("[SIM] BUZZER pattern=%s (%d beeps)", pattern, len(schedule) // 2)
+        write = self._set_buzzer
+        monotonic, sleep = time.monotonic, time.sleep
+        t0 = monotonic()
+        for offset, level in schedule:
+            delay = t0 + offset - monotonic()
+            if delay > 0:
+                sleep(delay)
+            write(level)
 
     # -------------------------------------------------------------------------
     # PIR Sensor
@@ -190,7 +337,28 @@ class GPIOController:
         if self.simulate:
             return False
 
-        return GPIO.input(self.PIN_PIR) == GPIO.HIGH
+        return self._read_pin(self.PIN_PIR)
+
+    def wait_for_motion(self, timeout=1.0):
+        """
+        Block until the PIR output rises, without polling.
+
+        Args:
+            timeout: Seconds to wait.
+
+        Returns:
+            bool: True if motion was detected within the timeout.
+        """
+        if self.simulate:
+            time.sleep(timeout)
+            return False
+
+        if self.read_pir():
+            return True
+        channel = GPIO.wait_for_edge(
+            self.PIN_PIR, GPIO.RISING, timeout=max(1, int(timeout * 1000))
+        )
+        return channel is not None
 
     # -------------------------------------------------------------------------
     # Buttons
@@ -210,11 +378,20 @@ class GPIOController:
             self._inside_callback = inside_callback
             return
 
+        callbacks = {}
+        if outside_callback:
+            callbacks[self.PIN_OUTSIDE_BTN] = outside_callback
+        if inside_callback:
+            callbacks[self.PIN_INSIDE_BTN] = inside_callback
+        if callbacks and self.button_backend != "rpi" and GPIOD_AVAILABLE:
+            if self._start_gpiod_buttons(callbacks):
+                return
+
         if outside_callback:
             GPIO.add_event_detect(
                 self.PIN_OUTSIDE_BTN,
                 GPIO.FALLING,
-                callback=lambda ch: outside_callback(),
+                callback=self._debounced(outside_callback),
                 bouncetime=self.debounce_time
             )
             logger.info("Outside button callback registered on GPIO %d", self.PIN_OUTSIDE_BTN)
@@ -223,22 +400,116 @@ class GPIOController:
             GPIO.add_event_detect(
                 self.PIN_INSIDE_BTN,
                 GPIO.FALLING,
-                callback=lambda ch: inside_callback(),
+                callback=self._debounced(inside_callback),
                 bouncetime=self.debounce_time
             )
             logger.info("Inside button callback registered on GPIO %d", self.PIN_INSIDE_BTN)
 
+    def _start_gpiod_buttons(self, callbacks):
+        """
+        Watch the button lines with one libgpiod edge-event thread.
+
+        Args:
+            callbacks: dict of BCM pin -> no-arg callback.
+
+        Returns:
+            bool: True if the lines were requested; False to fall back to
+            RPi.GPIO edge detection.
+        """
+        settings = gpiod.LineSettings(
+            edge_detection=Edge.FALLING,
+            bias=Bias.PULL_UP,
+            debounce_period=timedelta(milliseconds=self.debounce_time),
+        )
+        try:
+            self._button_request = gpiod.request_lines(
+                self.gpiochip,
+                consumer="gym-door-buttons",
+                config={tuple(callbacks): settings},
+            )
+        except OSError as e:
+            logger.warning("libgpiod button request failed (%s) — using RPi.GPIO", e)
+            return False
+
+        self._button_thread = threading.Thread(
+            target=self._button_event_loop, args=(callbacks,),
+            name="button-events", daemon=True
+        )
+        self._button_thread.start()
+        logger.info("Button callbacks registered via libgpiod on GPIO %s",
+                    ", ".join(str(pin) for pin in callbacks))
+        return True
+
+    def _button_event_loop(self, callbacks):
+        """Dispatch debounced falling edges from the kernel to callbacks."""
+        request = self._button_request
+        min_gap_ns = self.debounce_time * 1_000_000
+        last_press = dict.fromkeys(callbacks, -min_gap_ns)
+        wait = timedelta(seconds=1)
+
+        while not self._closing:
+            try:
+                if not request.wait_edge_events(wait):
+                    continue
+                events = request.read_edge_events()
+            except (OSError, ValueError):
+                if self._closing:
+                    return
+                raise
+            for event in events:
+                pin = event.line_offset
+                # Kernel timestamps, so thread scheduling delay doesn't
+                # turn one press into two
+                if event.timestamp_ns - last_press[pin] < min_gap_ns:
+                    continue
+                last_press[pin] = event.timestamp_ns
+                try:
+                    callbacks[pin]()
+                except Exception:
+                    logger.exception("Button callback for GPIO %d failed", pin)
+
+    def _debounced(self, callback):
+        """
+        Wrap a button callback so it fires only on a press that holds.
+
+        RPi.GPIO's bouncetime only mutes edges *after* the first one, so a
+        noisy first edge still fires. This waits half the debounce time,
+        re-reads the pin (buttons are active low), and also ignores presses
+        closer than debounce_time to the previous accepted one.
+        """
+        settle = self.debounce_time / 2000.0
+        min_gap_ns = self.debounce_time * 1_000_000
+        last_press = [-min_gap_ns]
+
+        # RPi.GPIO calls this directly with the channel, so it is the only
+        # Python frame per edge; default args keep lookups local. The gap
+        # check is integer nanoseconds on the monotonic clock and runs
+        # before the settle sleep, so bounce storms return immediately.
+        def handler(channel, _read=self._read_pin, _sleep=time.sleep,
+                    _now=time.monotonic_ns, _callback=callback):
+            now = _now()
+            if now - last_press[0] < min_gap_ns:
+                return
+            _sleep(settle)
+            if _read(channel):
+                logger.debug("Ignored bounce on GPIO %d", channel)
+                return
+            last_press[0] = now
+            _callback()
+
+        return handler
+
     def read_outside_button(self):
         """Read outside button state (active low)."""
         if self.simulate:
             return False
-        return GPIO.input(self.PIN_OUTSIDE_BTN) == GPIO.LOW
+        return not self._read_pin(self.PIN_OUTSIDE_BTN)
 
     def read_inside_button(self):
         """Read inside button state (active low)."""
         if self.simulate:
             return False
-        return GPIO.input(self.PIN_INSIDE_BTN) == GPIO.LOW
+        return not self._read_pin(self.PIN_INSIDE_BTN)
 
     # -------------------------------------------------------------------------
     # Flash LED
@@ -246,18 +517,12 @@ class GPIOController:
 
     def flash_on(self):
         """Turn on the camera flash LED."""
-        if self.simulate:
-            logger.info("[SIM] FLASH LED ON")
-        else:
-            GPIO.output(self.PIN_FLASH, GPIO.HIGH)
+        self._set_flash(True)
         self._flash_on = True
 
     def flash_off(self):
         """Turn off the camera flash LED."""
-        if self.simulate:
-            logger.info("[SIM] FLASH LED OFF")
-        else:
-            GPIO.output(self.PIN_FLASH, GPIO.LOW)
+        self._set_flash(False)
         self._flash_on = False
 
     def is_flash_on(self):
@@ -270,13 +535,24 @@ class GPIOController:
 
     def cleanup(self):
         """Clean up GPIO resources. Call on program exit."""
-        if self._relay_timer:
-            self._relay_timer.cancel()
+        self._closing = True
+        self._relay_wakeup.set()
+        self._buzzer_q.put(None)
+
+        request, self._button_request = self._button_request, None
+        if self._button_thread is not None:
+            self._button_thread.join(timeout=2)
+        if request is not None:
+            request.release()
 
         if not self.simulate:
-            GPIO.output(self.PIN_RELAY, GPIO.LOW)
-            GPIO.output(self.PIN_BUZZER, GPIO.LOW)
-            GPIO.output(self.PIN_FLASH, GPIO.LOW)
+            self._write_pin(self.PIN_RELAY, False)
+            self._write_pin(self.PIN_BUZZER, False)
+            self._write_pin(self.PIN_FLASH, False)
+            regs, self._gpio_regs = self._gpio_regs, None
+            if regs is not None:
+                regs.release()
+                self._gpiomem.close()
             GPIO.cleanup()
 
         logger.info("GPIO cleaned up")
@@ -6,15 +6,70 @@ exported to CSV for offline review. Also configures the Python logging system.
 """
 
 import os
+import io
 import csv
+import gzip
+import math
+import queue
+import shutil
+import atexit
+import operator
+import itertools
 import logging
 import logging.handlers
-from datetime import datetime
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+
+from modules.database import Database, LOG_EXPORT_COLUMNS
+
+# Position of the timestamp in exported rows
+_EXPORT_TS = LOG_EXPORT_COLUMNS.index("timestamp")
+_first = operator.itemgetter(0)
+
+try:
+    from systemd.journal import JournalHandler
+    JOURNAL_AVAILABLE = True
+except ImportError:
+    JOURNAL_AVAILABLE = False
+
+
+class _BatchedRotatingFileHandler(logging.handlers.RotatingFileHandler):
+    """
+    RotatingFileHandler that checks the file size only every so many bytes.
+
+    The stock handler seeks to the end of the log file on every emit to
+    decide on rollover. This one counts the bytes it writes and only looks
+    at the real size once a tenth of maxBytes has gone out since the last
+    look, so the file can overshoot maxBytes by at most that much.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._check_bytes = max(1, self.maxBytes // 10)
+        self._bytes_since_check = 0
+
+    def emit(self, record):
+        try:
+            msg = self.format(record) + self.terminator
+            self._bytes_since_check += len(msg)
+            if self.stream is None:
+                self.stream = self._open()
+            if self.maxBytes > 0 and self._bytes_since_check >= self._check_bytes:
+                self._bytes_since_check = 0
+                if self.stream.tell() + len(msg) >= self.maxBytes:
+                    self.doRollover()
+            self.stream.write(msg)
+            self.flush()
+        except RecursionError:
+            raise
+        except Exception:
+            self.handleError(record)
 
 
 def setup_logging(config):
     """
-    Configure the Python logging system with file and console handlers.
+    Configure the Python logging system with journald, file and console handlers.
 
     Args:
         config: dict from settings.yaml 'logging' section.
@@ -24,10 +79,8 @@ def setup_logging(config):
     backup_count = config.get("backup_count", 5)
     log_level = config.get("log_level", "INFO")
 
-    # Create log directory
-    log_dir = os.path.dirname(log_file)
-    if log_dir:
-        os.makedirs(log_dir, exist_ok=True)
+    use_journal = config.get("use_journal", True)
+    log_to_file = config.get("log_to_file", True)
 
     # Root logger
     root_logger = logging.getLogger()
@@ -39,22 +92,41 @@ def setup_logging(config):
         datefmt="%Y-%m-%d %H:%M:%S"
     )
 
-    # Rotating file handler
-    file_handler = logging.handlers.RotatingFileHandler(
-        log_file,
-        maxBytes=max_size_mb * 1024 * 1024,
-        backupCount=backup_count
-    )
-    file_handler.setFormatter(formatter)
-    root_logger.addHandler(file_handler)
+    # When started as a systemd service, hand records straight to journald
+    # over its socket; it timestamps, rotates and persists them on its own
+    # schedule. systemd sets JOURNAL_STREAM (stdout/stderr wired to the
+    # journal) and INVOCATION_ID for units; interactive runs have neither.
+    journal = (use_journal and JOURNAL_AVAILABLE
+               and bool(os.environ.get("JOURNAL_STREAM") or os.environ.get("INVOCATION_ID")))
+    if journal:
+        root_logger.addHandler(JournalHandler(SYSLOG_IDENTIFIER="gym_door"))
+
+    # Rotating file handler (always kept when journald isn't available)
+    if not journal:
+        log_to_file = True
+    if log_to_file:
+        log_dir = os.path.dirname(log_file)
+        if log_dir:
+            os.makedirs(log_dir, exist_ok=True)
+
+        file_handler = _BatchedRotatingFileHandler(
+            log_file,
+            maxBytes=max_size_mb * 1024 * 1024,
+            backupCount=backup_count
+        )
+        file_handler.setFormatter(formatter)
+        root_logger.addHandler(file_handler)
 
-    # Console handler
-    console_handler = logging.StreamHandler()
-    console_handler.setFormatter(formatter)
-    console_handler.setLevel(logging.INFO)
-    root_logger.addHandler(console_handler)
+    # Console handler; under the service stdout/stderr already go to the
+    # journal, so it would only duplicate the JournalHandler's records
+    if not journal:
+        console_handler = logging.StreamHandler()
+        console_handler.setFormatter(formatter)
+        console_handler.setLevel(logging.INFO)
+        root_logger.addHandler(console_handler)
 
-    logging.info("Logging initialized — level=%s, file=%s", log_level, log_file)
+    logging.info("Logging initialized — level=%s, file=%s, journal=%s",
+                 log_level, log_file if log_to_file else None, journal)
 
 
 class AccessLogger:
@@ -77,14 +149,36 @@ class AccessLogger:
         if access_dir:
             os.makedirs(access_dir, exist_ok=True)
 
-        handler = logging.handlers.RotatingFileHandler(
+        handler = _BatchedRotatingFileHandler(
             self.access_log_file, maxBytes=5 * 1024 * 1024, backupCount=3
         )
         handler.setFormatter(logging.Formatter(
             "%(asctime)s | %(message)s", datefmt="%Y-%m-%d %H:%M:%S"
         ))
-        self._access_logger.addHandler(handler)
+
+        # Callers only enqueue the record; a listener thread does the
+        # rotating-file lock, size check and write
+        log_queue = queue.SimpleQueue()
+        self._queue_handler = logging.handlers.QueueHandler(log_queue)
+        self._listener = logging.handlers.QueueListener(log_queue, handler)
+        self._listener.start()
+        self._access_logger.addHandler(self._queue_handler)
         self._access_logger.setLevel(logging.INFO)
+        atexit.register(self.close)
+
+        # Fixed line layouts, bound once; records then carry a finished
+        # message and no args for the queue handler to merge
+        self._fmt_granted = "GRANTED | {} | {} | {} | confidence={:.3f}".format
+        self._fmt_denied = "DENIED  | Unknown | {} | {}".format
+        self._fmt_button = "BUTTON  | {} | {} | {}".format
+
+    def close(self):
+        """Write out queued access log lines and stop the listener thread."""
+        if self._listener is None:
+            return
+        self._access_logger.removeHandler(self._queue_handler)
+        self._listener.stop()
+        self._listener = None
 
     def log_access_granted(self, user_id, user_name, method, direction="in",
                            confidence=0.0, image_path=None):
@@ -99,7 +193,7 @@ class AccessLogger:
             confidence: Match confidence (0.0-1.0).
             image_path: Path to captured face image.
         """
-        log_id = self.db.log_access(
+        self.db.log_access(
             user_id=user_id,
             user_name=user_name,
             method=method,
@@ -109,13 +203,12 @@ class AccessLogger:
             confidence=confidence
         )
         self._access_logger.info(
-            "GRANTED | %s | %s | %s | confidence=%.3f | log_id=%d",
-            user_name, method, direction, confidence, log_id
+            self._fmt_granted(user_name, method, direction, confidence)
         )
 
     def log_access_denied(self, method, direction="in", image_path=None):
         """Log a failed access attempt."""
-        log_id = self.db.log_access(
+        self.db.log_access(
             user_id=None,
             user_name="Unknown",
             method=method,
@@ -123,9 +216,7 @@ class AccessLogger:
             status="denied",
             image_path=image_path
         )
-        self._access_logger.info(
-            "DENIED  | Unknown | %s | %s | log_id=%d", method, direction, log_id
-        )
+        self._access_logger.info(self._fmt_denied(method, direction))
 
     def log_button_event(self, button_type, action="pressed"):
         """
@@ -147,27 +238,37 @@ class AccessLogger:
             status=status
         )
         self._access_logger.info(
-            "BUTTON  | %s | %s | %s", button_type, action, direction
+            self._fmt_button(button_type, action, direction)
         )
 
-    def export_to_csv(self, output_path, start_date=None, end_date=None):
+    def export_to_csv(self, output_path, start_date=None, end_date=None,
+                      segment_by_day=False, jobs=1):
         """
         Export access logs to a CSV file.
 
         Args:
             output_path: Path for the CSV output file.
-            start_date: Filter start date (ISO format string).
-            end_date: Filter end date (ISO format string).
+            start_date: Filter start date, inclusive (ISO format string).
+            end_date: Filter end date, exclusive (ISO format string).
+            segment_by_day: Write one file per calendar day from the same
+                scan, named ``<stem>_YYYYMMDD<ext>`` after output_path.
+            jobs: With both dates given (and no segmenting), split the range
+                into this many day-aligned chunks exported by worker
+                processes, then joined in order.
+
+        A path ending in ``.gz`` is written gzip-compressed (level 1).
 
         Returns:
             int: Number of records exported.
         """
-        if start_date and end_date:
-            logs = self.db.get_logs_by_date(start_date, end_date)
-        else:
-            logs = self.db.get_recent_logs(limit=10000)
+        if jobs > 1 and start_date and end_date and not segment_by_day:
+            return self._export_parallel(output_path, start_date, end_date, jobs)
 
-        if not logs:
+        rows = self.db.iter_log_rows(start_date, end_date)
+
+        first = next(rows, None)
+        if first is None:
+            rows.close()  # hand the reader connection back now
             logging.info("No logs to export")
             return 0
 
@@ -176,45 +277,182 @@ class AccessLogger:
         if out_dir:
             os.makedirs(out_dir, exist_ok=True)
 
-        fieldnames = [
-            "id", "user_id", "user_name", "method", "direction",
-            "status", "timestamp", "confidence", "image_path"
-        ]
+        rows = itertools.chain((first,), rows)
+        if not segment_by_day:
+            count = self._write_csv(output_path, rows)
+            logging.info("Exported %d access logs to %s", count, output_path)
+            return count
+
+        # Rows arrive ordered by timestamp, so each day is one contiguous run
+        stem, ext = _split_export_path(output_path)
+        count = files = 0
+        for day, day_rows in itertools.groupby(rows, key=lambda row: row[_EXPORT_TS][:10]):
+            count += self._write_csv(f"{stem}_{day.replace('-', '')}{ext}", day_rows)
+            files += 1
+
+        logging.info("Exported %d access logs to %d daily files %s_*%s",
+                     count, files, stem, ext)
+        return count
+
+    def _export_parallel(self, output_path, start_date, end_date, jobs):
+        """Export [start_date, end_date) in day chunks on worker processes."""
+        self.db.flush()  # workers only see what is committed
+        chunks = _day_chunks(start_date, end_date, jobs)
+        stem, ext = _split_export_path(output_path)
+        parts = [f"{stem}.part{i}{ext}" for i in range(len(chunks))]
 
-        with open(output_path, "w", newline="") as f:
-            writer = csv.DictWriter(f, fieldnames=fieldnames, extrasaction="ignore")
-            writer.writeheader()
-            for log in logs:
-                writer.writerow(log)
+        out_dir = os.path.dirname(output_path)
+        if out_dir:
+            os.makedirs(out_dir, exist_ok=True)
 
-        logging.info("Exported %d access logs to %s", len(logs), output_path)
-        return len(logs)
+        # spawn, not fork: this process already runs logging/DB threads
+        ctx = multiprocessing.get_context("spawn")
+        try:
+            with ProcessPoolExecutor(max_workers=len(chunks), mp_context=ctx) as pool:
+                count = sum(pool.map(
+                    _export_chunk, itertools.repeat(self.db.db_path),
+                    [c[0] for c in chunks], [c[1] for c in chunks], parts
+                ))
+            if not count:
+                logging.info("No logs to export")
+                return 0
+
+            # Header, then the parts newest-first. Concatenated gzip members
+            # are still one valid .gz file.
+            self._write_csv(output_path, (), sync=False)
+            with open(output_path, "ab") as out:
+                for part in parts:
+                    with open(part, "rb") as f:
+                        shutil.copyfileobj(f, out, 1 << 20)
+                out.flush()
+                os.fsync(out.fileno())
+        finally:
+            for part in parts:
+                try:
+                    os.remove(part)
+                except FileNotFoundError:
+                    pass
+
+        logging.info("Exported %d access logs to %s (%d jobs)", count, output_path, len(chunks))
+        return count
+
+    @staticmethod
+    def _write_csv(path, rows, header=True, sync=True):
+        """Write a header plus `rows` to `path` (gzip if *.gz); return the row count."""
+        # zip() stops on the rows before drawing from the counter, so the
+        # counter's next value is the number of rows written. A 1 MiB
+        # buffer keeps the file writes large for long exports.
+        counter = itertools.count()
+        with open(path, "wb", buffering=1 << 20) as raw:
+            # Level 1 gzip is cheap next to SD card writes and CSV shrinks
+            # several times over
+            gz = gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=1) \
+                if path.endswith(".gz") else None
+            f = io.TextIOWrapper(gz or raw, encoding="utf-8", newline="")
+            writer = csv.writer(f)
+            if header:
+                writer.writerow(LOG_EXPORT_COLUMNS)
+            # map/itemgetter/zip are all C, so no Python frame runs per row
+            writer.writerows(map(_first, zip(rows, counter)))
+            f.flush()
+            f.detach()
+            if gz is not None:
+                gz.close()  # writes the trailer; leaves `raw` open
+            # One flush + fsync for the whole file, not per row
+            raw.flush()
+            if sync:
+                os.fsync(raw.fileno())
+        return next(counter)
 
     def get_daily_summary(self, date=None):
         """
         Get a summary of access events for a given date.
 
         Args:
-            date: Date string (YYYY-MM-DD). Defaults to today.
+            date: datetime.date or date string (YYYY-MM-DD). Defaults to today.
 
         Returns:
             dict: Summary statistics.
         """
-        if date is None:
-            date = datetime.now().strftime("%Y-%m-%d")
-
-        start = f"{date}T00:00:00"
-        end = f"{date}T23:59:59"
-        logs = self.db.get_logs_by_date(start, end)
-
-        summary = {
-            "date": date,
-            "total_events": len(logs),
-            "granted": sum(1 for l in logs if l["status"] == "granted"),
-            "denied": sum(1 for l in logs if l["status"] == "denied"),
-            "face_entries": sum(1 for l in logs if l["method"] == "face"),
-            "fingerprint_entries": sum(1 for l in logs if l["method"] == "fingerprint"),
-            "button_events": sum(1 for l in logs if "button" in l["method"]),
-        }
-
-        return summary
+        return daily_summary(self.db, date)
+
+
+def daily_summary(db, date=None):
+    """
+    Summarise one day's access events straight from the database.
+
+    Needs no AccessLogger, so read-only tools don't open the access log.
+
+    Args:
+        db: Database instance.
+        date: datetime.date or date string (YYYY-MM-DD). Defaults to today.
+
+    Returns:
+        dict: Summary statistics.
+    """
+    if date is None:
+        day = datetime.now().date()
+    elif isinstance(date, str):
+        day = datetime.strptime(date, "%Y-%m-%d").date()
+    else:
+        day = date
+
+    # Half-open day bounds, built once from the date object
+    start = f"{day.isoformat()}T00:00:00"
+    end = f"{(day + timedelta(days=1)).isoformat()}T00:00:00"
+    counts = db.get_daily_counts(start, end)
+
+    return {
+        "date": day.isoformat(),
+        "total_events": counts["total"],
+        "granted": counts["granted"],
+        "denied": counts["denied"],
+        "face_entries": counts["face"],
+        "fingerprint_entries": counts["fingerprint"],
+        "button_events": counts["button"],
+    }
+
+
+# -----------------------------------------------------------------------------
+# Export helpers
+# -----------------------------------------------------------------------------
+
+def _split_export_path(path):
+    """Split an export path into (stem, ext), keeping ``.csv.gz`` whole."""
+    stem, ext = os.path.splitext(path)
+    if ext == ".gz":
+        stem, csv_ext = os.path.splitext(stem)
+        ext = csv_ext + ext
+    return stem, ext
+
+
+def _day_chunks(start_date, end_date, jobs):
+    """
+    Split [start_date, end_date) into up to `jobs` day-aligned ranges.
+
+    Returns:
+        list: (start, end) ISO string pairs, newest first like the export.
+    """
+    start = datetime.fromisoformat(start_date)
+    end = datetime.fromisoformat(end_date)
+    days = max(1, math.ceil((end - start) / timedelta(days=1)))
+    step = timedelta(days=math.ceil(days / max(1, jobs)))
+
+    chunks = []
+    lo = start
+    while lo < end:
+        hi = min(lo + step, end)
+        chunks.append((lo.isoformat(), hi.isoformat()))
+        lo = hi
+    return chunks[::-1] or [(start_date, end_date)]
+
+
+def _export_chunk(db_path, start_date, end_date, path):
+    """Worker process: write one range's rows (no header) to `path`."""
+    db = Database(db_path, read_pool_size=1, read_only=True)
+    try:
+        return AccessLogger._write_csv(
+            path, db.iter_log_rows(start_date, end_date), header=False, sync=False
+        )
+    finally:
+        db.close()
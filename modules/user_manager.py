@@ -5,8 +5,11 @@ Coordinates between the face recognition module, fingerprint module,
 and database to provide unified user management.
 """
 
+import atexit
 import logging
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
 logger = logging.getLogger(__name__)
@@ -26,6 +29,17 @@ class UserManager:
         self.face = face_module
         self.fingerprint = fingerprint_module
 
+        # Disk/UART follow-up work after an enrollment runs here so the
+        # person at the door isn't kept waiting on JPEG writes
+        self._io_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="enroll-io")
+        self._cache_lock = threading.Lock()
+        self._cache_save_pending = False
+        atexit.register(self.close)
+
+    def close(self):
+        """Wait for pending background saves to finish."""
+        self._io_pool.shutdown(wait=True)
+
     def register_user(self, name, camera, enroll_face=True, enroll_fingerprint=True):
         """
         Register a new user with face encoding and/or fingerprint.
@@ -73,19 +87,18 @@ class UserManager:
         # --- Step 3: Store in Database ---
         user_id = self.db.add_user(name, face_encoding, fingerprint_id)
 
-        # Save face images to disk
-        if face_images:
-            for frame in face_images:
-                self.face.save_face_image(frame, user_id)
+        # Save face images to disk (background)
+        for frame in face_images:
+            self._io_pool.submit(self.face.save_face_image, frame, user_id)
 
-        # --- Step 4: Backup fingerprint template ---
+        # --- Step 4: Backup fingerprint template (background) ---
         if fingerprint_id >= 0 and self.fingerprint.is_connected():
-            template = self.fingerprint.download_template(fingerprint_id)
-            if template:
-                self.db.save_fingerprint_template(user_id, fingerprint_id, template)
+            self._io_pool.submit(self._backup_template, user_id, fingerprint_id)
 
-        # Reload face encodings cache
-        self._reload_face_cache()
+        # Add the new face in place and persist the cache (background)
+        if face_encoding is not None:
+            self.face.add_known_face(user_id, name, face_encoding)
+            self._persist_face_cache()
 
         result = {
             "user_id": user_id,
@@ -120,6 +133,30 @@ class UserManager:
 
         return None, frame, 0.0
 
+    def identify_by_face_worker(self, worker, num_attempts=3, timeout=2.0):
+        """
+        Identify a user from a running RecognitionWorker's results.
+
+        Args:
+            worker: started RecognitionWorker.
+            num_attempts: Number of recognition results to consider.
+            timeout: Seconds to wait for each result.
+
+        Returns:
+            tuple: (user_dict, frame, confidence) or (None, frame, 0.0)
+        """
+        last_frame = None
+        for _ in range(num_attempts):
+            result, frame = worker.get_result(timeout)
+            if frame is not None:
+                last_frame = frame
+            if result:
+                user = self.db.get_user(result["user_id"])
+                if user:
+                    return user, frame, result["confidence"]
+
+        return None, last_frame, 0.0
+
     def identify_by_fingerprint(self, timeout=10):
         """
         Attempt to identify a user by fingerprint.
@@ -137,7 +174,7 @@ class UserManager:
         result = self.fingerprint.search_fingerprint(timeout)
 
         if result:
-            user = self.db.get_user_by_fingerprint(result["fingerprint_id"])
+            user = self.db.get_user_by_fingerprint_light(result["fingerprint_id"])
             if user:
                 return user, result["confidence"]
             else:
@@ -216,7 +253,8 @@ class UserManager:
         for frame in images:
             self.face.save_face_image(frame, user_id)
 
-        self._reload_face_cache()
+        self.face.add_known_face(user_id, user["name"], encoding)
+        self._persist_face_cache()
         return True
 
     def update_user_fingerprint(self, user_id):
@@ -275,8 +313,9 @@ class UserManager:
         # Soft-delete in database
         self.db.delete_user(user_id)
 
-        # Reload face cache
-        self._reload_face_cache()
+        # Drop the face from the in-memory index
+        self.face.remove_known_face(user_id)
+        self._persist_face_cache()
 
         logger.info("User '%s' (ID=%d) deleted", user["name"], user_id)
         return True
@@ -301,8 +340,22 @@ class UserManager:
             })
         return result
 
-    def _reload_face_cache(self):
-        """Reload face encodings from DB into the recognition module."""
-        users = self.db.get_all_users()
-        self.face.load_known_faces(users)
-        self.face.save_encodings_cache()
+    def _backup_template(self, user_id, fingerprint_id):
+        """Copy a sensor template into the DB backup table."""
+        template = self.fingerprint.download_template(fingerprint_id)
+        if template:
+            self.db.save_fingerprint_template(user_id, fingerprint_id, template)
+
+    def _persist_face_cache(self):
+        """Queue one cache write; back-to-back edits share the same write."""
+        with self._cache_lock:
+            if self._cache_save_pending:
+                return
+            self._cache_save_pending = True
+        self._io_pool.submit(self._save_face_cache)
+
+    def _save_face_cache(self):
+        """Write the current in-memory encodings to the cache file."""
+        with self._cache_lock:
+            self._cache_save_pending = False
+            self.face.save_encodings_cache()
@@ -15,13 +15,17 @@ import sys
 import argparse
 import yaml
 
+try:
+    # libyaml C parser; much faster than the pure-Python one on a Pi
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeLoader
+
 # Add project root to path
 PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.insert(0, PROJECT_ROOT)
 
 from modules.database import Database
-from modules.face_recognition_module import FaceRecognitionModule
-from modules.fingerprint_module import FingerprintModule, SimulatedFingerprintModule
 from modules.user_manager import UserManager
 from modules.logger import setup_logging
 
@@ -30,11 +34,21 @@ def load_config():
     """Load configuration."""
     config_path = os.path.join(PROJECT_ROOT, "config/settings.yaml")
     with open(config_path, "r") as f:
-        return yaml.safe_load(f)
+        return yaml.load(f, Loader=SafeLoader)
+
+
+def init_modules(config, need_face=False, need_fingerprint=False):
+    """
+    Initialize modules needed for the requested command.
 
+    The face and fingerprint subsystems (dlib/OpenCV imports, encoding load,
+    UART open) are only brought up when asked for, so read-only commands
+    like --list and --stats start fast.
 
-def init_modules(config):
-    """Initialize modules needed for enrollment."""
+    Returns:
+        tuple: (db, face, fingerprint, user_manager); face/fingerprint are
+        None when not requested.
+    """
     system_config = config.get("system", {})
     simulate = system_config.get("simulate_gpio", False)
 
@@ -51,16 +65,21 @@ def init_modules(config):
     db = Database(db_path)
 
     # Face Recognition
-    face = FaceRecognitionModule(config.get("face_recognition", {}))
-    users = db.get_all_users()
-    face.load_known_faces(users)
+    face = None
+    if need_face:
+        from modules.face_recognition_module import FaceRecognitionModule
+        face = FaceRecognitionModule(config.get("face_recognition", {}))
+        face.load_known_encodings(*db.get_all_encodings_matrix())
 
     # Fingerprint
-    if simulate:
-        fingerprint = SimulatedFingerprintModule(config.get("fingerprint", {}))
-    else:
-        fingerprint = FingerprintModule(config.get("fingerprint", {}))
-    fingerprint.connect()
+    fingerprint = None
+    if need_fingerprint:
+        from modules.fingerprint_module import FingerprintModule, SimulatedFingerprintModule
+        if simulate:
+            fingerprint = SimulatedFingerprintModule(config.get("fingerprint", {}))
+        else:
+            fingerprint = FingerprintModule(config.get("fingerprint", {}))
+        fingerprint.connect()
 
     # User Manager
     user_manager = UserManager(db, face, fingerprint)
@@ -70,7 +89,9 @@ def init_modules(config):
 
 def enroll(args, config):
     """Enroll a new user."""
-    db, face, fingerprint, user_manager = init_modules(config)
+    db, face, fingerprint, user_manager = init_modules(
+        config, need_face=True, need_fingerprint=True
+    )
 
     enroll_face = not args.fingerprint_only
     enroll_fp = not args.face_only
@@ -150,7 +171,10 @@ def list_users(config):
 
 def delete_user(args, config):
     """Delete a user."""
-    db, face, fingerprint, user_manager = init_modules(config)
+    # Deleting removes the sensor template and rebuilds the face cache
+    db, face, fingerprint, user_manager = init_modules(
+        config, need_face=True, need_fingerprint=True
+    )
     user = db.get_user(args.delete)
 
     if not user:
@@ -6,40 +6,69 @@ Usage:
     python scripts/export_logs.py
     python scripts/export_logs.py --from 2026-01-01 --to 2026-02-17
     python scripts/export_logs.py --output /home/pi/logs_export.csv
+    python scripts/export_logs.py --from 2026-01-01 --segment-by day
     python scripts/export_logs.py --summary
     python scripts/export_logs.py --recent 20
 """
 
 import os
 import sys
+import time
+import logging
 import argparse
-import yaml
-from datetime import datetime
+from datetime import datetime, timedelta
 
 # Add project root to path
 PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.insert(0, PROJECT_ROOT)
 
-from modules.database import Database
-from modules.logger import setup_logging, AccessLogger
+# yaml and the project modules are imported where they are first needed,
+# so `--help` doesn't pay for them and `--recent` skips the AccessLogger
 
 
 def load_config():
     """Load configuration."""
+    import yaml
+    try:
+        # libyaml C parser; much faster than the pure-Python one on a Pi
+        from yaml import CSafeLoader as SafeLoader
+    except ImportError:
+        from yaml import SafeLoader
+
     config_path = os.path.join(PROJECT_ROOT, "config/settings.yaml")
     with open(config_path, "r") as f:
-        return yaml.safe_load(f)
+        return yaml.load(f, Loader=SafeLoader)
+
+
+def _date(value):
+    """argparse type: YYYY-MM-DD -> datetime.date, rejected up front if malformed."""
+    try:
+        return datetime.strptime(value, "%Y-%m-%d").date()
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid date '{value}' (expected YYYY-MM-DD)")
+
+
+def _access_logger(db, config):
+    """Build the AccessLogger (CSV export only)."""
+    from modules.logger import AccessLogger
+    return AccessLogger(db, config.get("logging", {}))
 
 
 def main():
     parser = argparse.ArgumentParser(description="Lumora Door Access — Export Access Logs")
-    parser.add_argument("--from", dest="start_date", type=str,
+    parser.add_argument("--from", dest="start_date", type=_date,
                         help="Start date (YYYY-MM-DD)")
-    parser.add_argument("--to", dest="end_date", type=str,
+    parser.add_argument("--to", dest="end_date", type=_date,
                         help="End date (YYYY-MM-DD)")
     parser.add_argument("--output", "-o", type=str,
                         default=None,
                         help="Output CSV file path")
+    parser.add_argument("--segment-by", choices=["day"], default=None,
+                        help="Write one CSV per day (<output>_YYYYMMDD.csv) from a single scan")
+    parser.add_argument("--jobs", "-j", type=int, default=1,
+                        help="Worker processes for a --from/--to export (day chunks)")
+    parser.add_argument("--gzip", action="store_true",
+                        help="Compress the CSV (adds .gz); any output ending in .gz is compressed")
     parser.add_argument("--summary", action="store_true",
                         help="Show daily summary instead of export")
     parser.add_argument("--recent", type=int, default=None,
@@ -49,23 +78,29 @@ def main():
     os.chdir(PROJECT_ROOT)
     config = load_config()
 
-    # Initialize
-    system_config = config.get("system", {})
-    log_config = {**config.get("logging", {}), "log_level": system_config.get("log_level", "INFO")}
-    setup_logging(log_config)
+    from modules.database import Database
+
+    # Initialize: only the export writes anything worth a system.log entry;
+    # the read-only views keep warnings on stderr and touch no log files
+    if args.summary or args.recent:
+        logging.basicConfig(level=logging.WARNING,
+                            format="%(levelname)s %(name)s | %(message)s")
+    else:
+        from modules.logger import setup_logging
+        system_config = config.get("system", {})
+        log_config = {**config.get("logging", {}),
+                      "log_level": system_config.get("log_level", "INFO")}
+        setup_logging(log_config)
 
     db_config = config.get("database", {})
     db_path = os.path.join(PROJECT_ROOT, db_config.get("path", "data/door_access.db"))
-    db = Database(db_path)
-    access_logger = AccessLogger(db, config.get("logging", {}))
+    # The tool only reads; open read-only unless the file doesn't exist yet
+    db = Database(db_path, read_pool_size=1, read_only=os.path.exists(db_path))
 
     # Daily summary
     if args.summary:
-        date = datetime.now().strftime("%Y-%m-%d")
-        if args.start_date:
-            date = args.start_date
-
-        summary = access_logger.get_daily_summary(date)
+        from modules.logger import daily_summary
+        summary = daily_summary(db, args.start_date)
         print(f"\n📊 Daily Summary for {summary['date']}")
         print(f"   Total events: {summary['total_events']}")
         print(f"   Granted: {summary['granted']}")
@@ -77,39 +112,45 @@ def main():
 
     # Recent logs
     if args.recent:
-        logs = db.get_recent_logs(args.recent)
+        logs = db.get_recent_log_lines(args.recent)
         if not logs:
             print("No access logs found.")
             return
 
-        print(f"\n{'Time':<22} {'User':<15} {'Method':<12} {'Dir':<5} {'Status':<10}")
-        print("-" * 66)
-        for log in logs:
-            ts = log["timestamp"][:19]
-            name = (log.get("user_name") or "Unknown")[:14]
-            method = log["method"][:11]
-            direction = log.get("direction", "?")
-            status = log["status"]
-            print(f"{ts:<22} {name:<15} {method:<12} {direction:<5} {status:<10}")
-
-        print(f"\nShowing {len(logs)} entries")
+        # Build the whole table and write it once instead of print() per row
+        lines = [
+            f"\n{'Time':<22} {'User':<15} {'Method':<12} {'Dir':<5} {'Status':<10}\n",
+            "-" * 66 + "\n",
+        ]
+        row_fmt = "{:<22} {:<15} {:<12} {:<5} {:<10}\n".format
+        lines.extend(row_fmt(*log) for log in logs)
+        lines.append(f"\nShowing {len(logs)} entries\n")
+        sys.stdout.write("".join(lines))
         return
 
     # CSV export
     if args.output:
         output_path = args.output
     else:
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        timestamp = time.strftime("%Y%m%d_%H%M%S")
         output_path = os.path.join(PROJECT_ROOT, f"data/logs/export_{timestamp}.csv")
 
+    if args.gzip and not output_path.endswith(".gz"):
+        output_path += ".gz"
+
+    access_logger = _access_logger(db, config)
     start_date = None
     end_date = None
     if args.start_date:
-        start_date = f"{args.start_date}T00:00:00"
+        start_date = f"{args.start_date.isoformat()}T00:00:00"
     if args.end_date:
-        end_date = f"{args.end_date}T23:59:59"
+        # Exclusive bound: midnight at the start of the following day
+        end_date = f"{(args.end_date + timedelta(days=1)).isoformat()}T00:00:00"
 
-    count = access_logger.export_to_csv(output_path, start_date, end_date)
+    count = access_logger.export_to_csv(
+        output_path, start_date, end_date,
+        segment_by_day=args.segment_by == "day", jobs=args.jobs
+    )
     print(f"\n✅ Exported {count} records to: {output_path}")
 
 
@@ -46,6 +46,7 @@ apt-get install -y -qq \
     libhdf5-serial-dev \
     libffi-dev \
     libssl-dev \
+    libyaml-dev \
     v4l-utils \
     git
 